@@ -1,34 +1,35 @@
-
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QFileDialog, 
-QSlider, QSizePolicy, QFrame, QGraphicsScene, QGraphicsView, QComboBox, QAction, QWidgetAction, QSpacerItem)
-from PyQt5.QtGui import QColor, QPixmap, QPainter, QPen, QImage, QPalette, QLinearGradient
-from PyQt5.QtCore import Qt, QTimer, QDateTime, pyqtSlot
-import cv2
-import json
+QSlider, QSizePolicy, QFrame, QGraphicsScene, QGraphicsView, QComboBox, QAction, QWidgetAction, QSpacerItem, QDialog, QFormLayout, QSpinBox,
+QDockWidget, QListWidget, QListWidgetItem, QTableWidget, QTableWidgetItem, QDoubleSpinBox, QAbstractItemView, QStyle,
+QStyleOptionSlider, QCheckBox, QDialogButtonBox, QProgressDialog, QActionGroup)
+from PyQt5.QtGui import QColor, QPixmap, QPainter, QPen, QImage, QPalette, QLinearGradient, QFontDatabase
+from PyQt5.QtCore import Qt, QTimer, QDateTime, QObject, QThread, QEvent, QPoint, QRect, QRectF, pyqtSignal, pyqtSlot
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
-from PyQt5 import QtWidgets
-from os import listdir
-from os.path import isfile, join
-from cv2 import VideoCapture, CAP_PROP_FPS, CAP_PROP_FRAME_COUNT
-import vlc
-from collections import defaultdict, Counter
+from os.path import isfile, basename
+from collections import defaultdict
+import time
+# cv2 (raw frames, export) and vlc (player) are imported when first needed, so the window shows up quickly
+from video_index import VideoIndex, cached_video_index, load_video_index
+from session import pair_files, build_session
+from thumbnails import load_atlas, build_thumbnails, ThumbnailAtlas
+from export import ExportSettings, export_segments
+from profiling import profiler
+from detections import (iter_detections, label_map, filter_mask, update_filter_mask, refilter_tail, print_filter_summary,
+                        load_cache, save_cache, DetectionTable, DetectionTableBuilder, DetectionTail, FilterSettings,
+                        SegmentIndex, OccupancyPyramid, SumPyramid, unique_sorted)
 
 class ImageWindow(QMainWindow):
-    def __init__(self, img):
+    def __init__(self, img, frame_server=None, frame_index=0):
         super().__init__()
         self.setWindowTitle("Unfiltered Frame")
 
-        self.img = img  # save the image for later saving
-
-        # Convert the OpenCV image format to QPixmap
-        qimg = QImage(img.data, img.shape[1], img.shape[0], img.strides[0], QImage.Format_RGB888).rgbSwapped()
-        pixmap = QPixmap.fromImage(qimg)
+        self.frame_server = frame_server  # RawFrameServer used for stepping between frames
+        self.frame_index = frame_index
 
-        # Create QGraphicsScene and add QPixmap to it
+        # Create QGraphicsScene with an item for the frame's QPixmap
         self.scene = QGraphicsScene(self)
-        self.scene.addPixmap(pixmap)
+        self.pixmap_item = self.scene.addPixmap(QPixmap())
+        self.set_frame(img, frame_index)
 
         # Create GraphicsView and set its scene
         self.view = GraphicsView(self.scene)
@@ -40,6 +41,18 @@ class ImageWindow(QMainWindow):
         # Set GraphicsView and QPushButton as central widgets
         layout = QVBoxLayout()
         layout.addWidget(self.view)
+
+        # Buttons for stepping through the raw video one frame at a time
+        if frame_server is not None:
+            step_layout = QHBoxLayout()
+            self.previous_button = QPushButton("< Previous Frame", self)
+            self.previous_button.clicked.connect(lambda: self.step(-1))
+            self.next_button = QPushButton("Next Frame >", self)
+            self.next_button.clicked.connect(lambda: self.step(1))
+            step_layout.addWidget(self.previous_button)
+            step_layout.addWidget(self.next_button)
+            layout.addLayout(step_layout)
+
         layout.addWidget(self.save_button)
 
         widget = QWidget()
@@ -48,11 +61,33 @@ class ImageWindow(QMainWindow):
 
         self.show()
 
+    def set_frame(self, img, frame_index):
+        self.img = img  # save the image for later saving
+        self.frame_index = frame_index
+        self.setWindowTitle(f"Unfiltered Frame {frame_index}")
+
+        # Convert the OpenCV image format to QPixmap
+        qimg = QImage(img.data, img.shape[1], img.shape[0], img.strides[0], QImage.Format_RGB888).rgbSwapped()
+        self.pixmap_item.setPixmap(QPixmap.fromImage(qimg))
+
+    def step(self, offset):
+        frame = self.frame_server.get_frame(self.frame_index + offset)
+        if frame is not None:
+            self.set_frame(frame, self.frame_index + offset)
+            self.frame_server.prefetch_around(self.frame_index)
+
+    def keyPressEvent(self, event):
+        if self.frame_server is not None and event.key() in (Qt.Key_Left, Qt.Key_Right):
+            self.step(-1 if event.key() == Qt.Key_Left else 1)
+        else:
+            super().keyPressEvent(event)
+
     @pyqtSlot()
     def save_image(self):
         file_dialog = QFileDialog()
         file_path, _ = file_dialog.getSaveFileName(self, "Save Image", "", "PNG Files (*.png)")
         if file_path:
+            import cv2
             cv2.imwrite(file_path, self.img)
 
 
@@ -81,8 +116,12 @@ class GraphicsView(QGraphicsView):
 
 #Creating a class for making the component visualization
 class DetectionsTimeline(QWidget):
+    view_changed = pyqtSignal()  # the visible frame range was zoomed or panned
     frame_count = 1
     component_names = ['Anchor', 'Buoy', 'Chain', 'Fiber thimple', 'H-link', 'Rope', 'Shackle', 'Triplate', 'Wire', 'Wire socket', 'Components']
+    stats_metrics = ['Detections per frame', 'Box area', 'Horizontal position', 'Vertical position']
+    # Colors of the statistics lane from low to high
+    heat_colors = np.array([[48, 18, 110], [170, 40, 110], [240, 110, 40], [250, 230, 120]], dtype=np.float64)
 
     def __init__(self, parent= "VideoPlayerWindow"):
         # Initializing colors, component number dictionary and layout
@@ -102,8 +141,19 @@ class DetectionsTimeline(QWidget):
         }
 
         self.detections = {}
+        self.pyramids = {}  # {component: OccupancyPyramid} for drawing any zoom level quickly
+        self.stats = None         # DetectionStats of all detections, before filtering
+        self.stats_metric = None  # one of stats_metrics shown in an extra lane, None hides the lane
+        self.stats_pyramids = None  # (SumPyramid of detections, SumPyramid of the metric, full-scale value)
         self.frame_count = 0
         self.current_frame = 0
+        self.timeline_image = None  # pre-rendered lanes, redrawn only when the size, view or detections change
+
+        # Visible frame range, zoomed with the mouse wheel and panned by dragging
+        self.view_start = 0.0
+        self.view_span = 1.0
+        self.drag_start = None
+        self.setToolTip("Scroll to zoom, drag to pan, double-click to show the whole video")
 
         #Visualization of timeline
         frame_count = 0
@@ -114,48 +164,806 @@ class DetectionsTimeline(QWidget):
         self.layout.addLayout(self.color_legend_layout)
         self.color_legend_labels = []
 
+    # Layout of the lanes in pixels
+    left_margin = 100
+    right_margin = 85
+    space_size = 30
+    vertical_offset = 15
+    lane_height = 11
+    min_view_span = 10  # frames shown when zoomed in all the way
+
     def set_frame_count(self, frame_count):
         self.frame_count = frame_count
-        self.update()
+        self.view_start, self.view_span = 0.0, float(frame_count + 1)
+        self.build_pyramids()
+        self.view_changed.emit()
         print(f'Set frame count: {frame_count}')
        
     # updating visualization of the timeline 
     def set_detections(self, detections):  
         self.detections = detections
+        self.build_pyramids()
+
+    # Redraws the lanes from first_frame on, e.g. while the detection file is still being written
+    def update_detections(self, detections, first_frame):
+        self.detections = detections
+        for component in list(self.pyramids):
+            if component not in detections:
+                del self.pyramids[component]
+        for component, frames in detections.items():
+            pyramid = self.pyramids.get(component)
+            new_frames = frames[np.searchsorted(frames, first_frame):]
+            # a lane only reaches its own last frame when there is no video, or past the end of one still being recorded
+            if pyramid is None or not pyramid.fits(first_frame, new_frames):
+                self.pyramids[component] = OccupancyPyramid(frames, self.frame_count + 1)
+            else:
+                pyramid.replace_from(first_frame, new_frames)
+        self.timeline_image = None
+        self.update()
+
+    def set_stats(self, stats):
+        if stats is self.stats:
+            return
+        self.stats = stats
+        self.build_stats_pyramids()
+
+    def set_stats_metric(self, metric):
+        self.stats_metric = metric
+        self.build_stats_pyramids()
+
+    # Sum pyramids of the per-frame statistics, so the lane costs O(columns) per redraw like the others
+    def build_stats_pyramids(self):
+        self.stats_pyramids = None
+        if self.stats is not None and self.stats_metric is not None and self.stats.frame_count:
+            totals = self.stats.totals().astype(np.float64)
+            if self.stats_metric == 'Detections per frame':
+                values = totals
+            elif self.stats_metric == 'Box area':
+                values = self.stats.area_sum.astype(np.float64)
+            else:
+                values = self.stats.center_sum[:, 0 if self.stats_metric == 'Horizontal position' else 1].astype(np.float64)
+
+            # Counts and areas are scaled to the 99th percentile of the frames with detections, positions are fractions
+            if self.stats_metric in ('Detections per frame', 'Box area'):
+                hit = totals > 0
+                per_frame = values[hit] / totals[hit] if self.stats_metric == 'Box area' else values[hit]
+                scale = np.percentile(per_frame, 99) if len(per_frame) else 1.0
+            else:
+                scale = 1.0
+            self.stats_pyramids = (SumPyramid(totals), SumPyramid(values), max(float(scale), 1e-9))
+        self.timeline_image = None
+        self.update()
+
+    def build_pyramids(self):
+        self.pyramids = {}
+        for component, frames in self.detections.items():
+            if not isinstance(frames, np.ndarray):
+                frames = np.fromiter(frames, dtype=np.int64, count=len(frames))
+            self.pyramids[component] = OccupancyPyramid(frames, self.frame_count + 1)
+        self.timeline_image = None
         self.update()  # update will cause the widget to be repainted
 
+    # Moves the playhead, only the old and new playhead columns are repainted
+    def set_current_frame(self, frame):
+        if frame != self.current_frame:
+            old_x = self.frame_to_x(self.current_frame)
+            self.current_frame = frame
+
+            # Keep the playhead in view while zoomed in
+            if not self.view_start <= frame < self.view_start + self.view_span:
+                self.set_view(frame - 0.1 * self.view_span, self.view_span)
+                return
+
+            new_x = self.frame_to_x(frame)
+            self.update(old_x - 1, 0, 3, self.height())
+            self.update(new_x - 1, 0, 3, self.height())
+
     def get_color_for_component(self, component):
         return self.component_colors.get(component, QColor(2, 230, 240))  # default to white color if component not found
 
+    def lane_width(self):
+        return max(self.width() - self.left_margin - self.right_margin, 1)
+
+    # Calculate the width of one frame in pixels
+    def frame_width(self):
+        return self.lane_width() / self.view_span
+
+    def frame_to_x(self, frame):
+        return int((frame - self.view_start) * self.frame_width() + self.left_margin)
+
+    def x_to_frame(self, x):
+        return (x - self.left_margin) / self.frame_width() + self.view_start
+
+    # Shows view_span frames starting at view_start, kept inside the video
+    def set_view(self, view_start, view_span):
+        full_span = float(self.frame_count + 1)
+        view_span = min(max(view_span, min(self.min_view_span, full_span)), full_span)
+        view_start = min(max(view_start, 0.0), full_span - view_span)
+        if (view_start, view_span) != (self.view_start, self.view_span):
+            self.view_start, self.view_span = view_start, view_span
+            self.timeline_image = None
+            self.update()
+            self.view_changed.emit()
+
+    def wheelEvent(self, event):
+        # Zoom around the frame under the mouse
+        anchor = self.x_to_frame(event.pos().x())
+        view_span = self.view_span / 1.25 ** (event.angleDelta().y() / 120)
+        view_span = min(max(view_span, min(self.min_view_span, self.frame_count + 1)), self.frame_count + 1)
+        self.set_view(anchor - (event.pos().x() - self.left_margin) / self.lane_width() * view_span, view_span)
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self.drag_start = (event.pos().x(), self.view_start)
+
+    def mouseMoveEvent(self, event):
+        if self.drag_start is not None:
+            start_x, view_start = self.drag_start
+            self.set_view(view_start - (event.pos().x() - start_x) / self.frame_width(), self.view_span)
+
+    def mouseReleaseEvent(self, event):
+        self.drag_start = None
+
+    def mouseDoubleClickEvent(self, event):
+        self.set_view(0.0, self.frame_count + 1)
+
+    def resizeEvent(self, event):
+        self.timeline_image = None
+        super().resizeEvent(event)
+
+    # Renders the visible frame range of all lanes into an image. Frames that fall on the same pixel
+    # column are binned into one column whose opacity shows how many of its frames have a detection;
+    # the pyramids make this cost the same at every zoom level and video length.
+    @profiler.timed('timeline render')
+    def render_timeline(self):
+        width, height = self.width(), self.height()
+        pixels = np.zeros((height, width, 4), dtype=np.uint8)
+        lane_width = self.lane_width()
+        frames_per_column = self.view_span / lane_width
+
+        lane = 0
+        for comp in self.component_names:
+            if comp not in self.pyramids:
+                continue
+            top = lane * self.space_size + self.vertical_offset
+            lane += 1
+            if top >= height:
+                continue
+
+            density = self.pyramids[comp].column_density(self.view_start, frames_per_column, lane_width)
+            hit = np.nonzero(density)[0]
+            columns = hit + self.left_margin
+            columns, density = columns[columns < width], density[hit][columns < width]
+
+            color = self.get_color_for_component(comp)
+            lane_pixels = pixels[top:top + self.lane_height, columns]
+            lane_pixels[..., 0] = color.red()
+            lane_pixels[..., 1] = color.green()
+            lane_pixels[..., 2] = color.blue()
+            lane_pixels[..., 3] = (160 + 95 * density).astype(np.uint8)
+            pixels[top:top + self.lane_height, columns] = lane_pixels
+
+        top = lane * self.space_size + self.vertical_offset
+        if self.stats_pyramids is not None and top < height:
+            totals, values, scale = self.stats_pyramids
+            counts = totals.column_sums(self.view_start, frames_per_column, lane_width)
+            hit = np.nonzero(counts)[0]
+            if self.stats_metric == 'Detections per frame':
+                level = counts[hit] / max(frames_per_column, 1) / scale  # mean over all frames of the column
+            else:
+                level = values.column_sums(self.view_start, frames_per_column, lane_width)[hit] / counts[hit] / scale
+            columns = hit + self.left_margin
+            inside = columns < width
+            level = np.clip(level[inside], 0, 1) * (len(self.heat_colors) - 1)
+            anchors = np.arange(len(self.heat_colors))
+            colors = np.column_stack([np.interp(level, anchors, self.heat_colors[:, c]) for c in range(3)])
+            pixels[top:top + self.lane_height, columns[inside], :3] = colors.astype(np.uint8)
+            pixels[top:top + self.lane_height, columns[inside], 3] = 255
+
+        image = QImage(pixels.data, width, height, width * 4, QImage.Format_RGBA8888)
+        return image.copy()  # the QImage must own its memory once pixels goes away
+
+    @profiler.timed('timeline paint')
     def paintEvent(self, event):        #Painting the component timeline
+        if self.timeline_image is None or self.timeline_image.size() != self.size():
+            self.timeline_image = self.render_timeline()
+
         painter = QPainter(self)
+        painter.drawImage(event.rect(), self.timeline_image, event.rect())
+
+        # Draw the playhead on top of the cached lanes
+        if self.frame_count:
+            x = self.frame_to_x(self.current_frame)
+            painter.setPen(QPen(QColor(255, 0, 0), 1))
+            painter.drawLine(x, 0, x, self.height())
+
+# Row of video thumbnails above the DetectionsTimeline, covering the same (zoomed) frame range
+class ThumbnailStrip(QWidget):
+    strip_height = 45
+
+    def __init__(self, timeline, parent=None):
+        super().__init__(parent)
+        self.timeline = timeline
+        self.atlas = ThumbnailAtlas()
+        self.pixmaps = {}  # {frame: QPixmap}, decoded once per thumbnail
+        self.setFixedHeight(self.strip_height)
+        timeline.view_changed.connect(self.update)
+
+    def set_atlas(self, atlas):
+        self.atlas = atlas
+        self.pixmaps = {}
+        self.update()
+
+    def pixmap(self, frame, jpeg):
+        if frame not in self.pixmaps:
+            pixmap = QPixmap()
+            pixmap.loadFromData(jpeg, 'JPG')
+            self.pixmaps[frame] = pixmap.scaledToHeight(self.strip_height, Qt.SmoothTransformation)
+        return self.pixmaps[frame]
+
+    @profiler.timed('thumbnail strip paint')
+    def paintEvent(self, event):
+        if not len(self.atlas) or not self.timeline.frame_count:
+            return
+        painter = QPainter(self)
+        left = self.timeline.left_margin
+        right = self.width() - self.timeline.right_margin
+        painter.setClipRect(left, 0, right - left, self.height())
+
+        # One slot per thumbnail width, showing the thumbnail closest to the frame in its middle
+        slot_width = self.pixmap(*self.atlas.nearest(0)).width() or self.strip_height
+        for x in range(left, right, slot_width):
+            frame, jpeg = self.atlas.nearest(self.timeline.x_to_frame(x + slot_width / 2))
+            painter.drawPixmap(x, 0, self.pixmap(frame, jpeg))
+
+
+# Thumbnail of the frame under the mouse while hovering over the playback slider
+class SliderPreview(QLabel):
+    def __init__(self, slider):
+        super().__init__(slider, Qt.ToolTip)
+        self.slider = slider
+        self.atlas = ThumbnailAtlas()
+        slider.setMouseTracking(True)
+        slider.installEventFilter(self)
+
+    def set_atlas(self, atlas):
+        self.atlas = atlas
+
+    # Slider value under x, the same mapping the slider uses for clicks
+    def value_at(self, x):
+        option = QStyleOptionSlider()
+        self.slider.initStyleOption(option)
+        style = self.slider.style()
+        groove = style.subControlRect(QStyle.CC_Slider, option, QStyle.SC_SliderGroove, self.slider)
+        handle = style.subControlRect(QStyle.CC_Slider, option, QStyle.SC_SliderHandle, self.slider)
+        return QStyle.sliderValueFromPosition(self.slider.minimum(), self.slider.maximum(),
+                                              x - groove.x() - handle.width() // 2, groove.width() - handle.width())
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.MouseMove:
+            frame, jpeg = self.atlas.nearest(self.value_at(event.pos().x()))
+            if jpeg is not None:
+                pixmap = QPixmap()
+                pixmap.loadFromData(jpeg, 'JPG')
+                self.setPixmap(pixmap)
+                self.adjustSize()
+                position = self.slider.mapToGlobal(QPoint(event.pos().x() - self.width() // 2, -self.height() - 4))
+                self.move(position)
+                self.show()
+        elif event.type() in (QEvent.Leave, QEvent.Hide):
+            self.hide()
+        return False
+
+
+# Transparent window on top of the VLC video surface that draws the boxes of the current frame.
+# VLC renders into video_view's native window, so a child widget would be painted over; this is a
+# frameless tool window that follows video_view around instead.
+class DetectionOverlay(QWidget):
+    def __init__(self, video_view, get_color, parent):
+        super().__init__(parent, Qt.Tool | Qt.FramelessWindowHint | Qt.WindowTransparentForInput)
+        self.setAttribute(Qt.WA_TranslucentBackground)
+        self.setAttribute(Qt.WA_ShowWithoutActivating)
+        self.video_view = video_view
+        self.get_color = get_color
+        self.table = DetectionTable.empty()
+        self.frame = -1
+        self.video_size = (0, 0)
+
+        # Follow the video when it or the main window moves or changes size
+        video_view.installEventFilter(self)
+        parent.installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if event.type() in (QEvent.Move, QEvent.Resize, QEvent.Show):
+            self.follow_video_view()
+        return False
+
+    def showEvent(self, event):
+        self.follow_video_view()
+        super().showEvent(event)
+
+    def follow_video_view(self):
+        self.setGeometry(QRect(self.video_view.mapToGlobal(QPoint(0, 0)), self.video_view.size()))
+
+    def set_table(self, table):
+        self.table = table
+        self.update()
+
+    def set_frame(self, frame):
+        if frame != self.frame:
+            self.frame = frame
+            self.update()
+
+    def set_video_size(self, width, height):
+        self.video_size = (width, height)
+        self.update()
+
+    # Part of the widget the video is shown in, VLC keeps the aspect ratio and adds black bars
+    def video_rect(self):
+        width, height = self.width(), self.height()
+        video_width, video_height = self.video_size
+        if not video_width or not video_height:
+            return QRectF(0, 0, width, height)
+        scale = min(width / video_width, height / video_height)
+        shown_width, shown_height = video_width * scale, video_height * scale
+        return QRectF((width - shown_width) / 2, (height - shown_height) / 2, shown_width, shown_height)
+
+    @profiler.timed('overlay paint')
+    def paintEvent(self, event):
+        rows = self.table.rows_for_frame(self.frame)
+        if rows.start == rows.stop:
+            return
+
+        painter = QPainter(self)
+        rect = self.video_rect()
+        boxes = self.table.bbox[rows]
+        # Sort each pair so exports with swapped min/max still give a valid rectangle
+        xs = np.sort(boxes[:, [0, 2]], axis=1) * rect.width() + rect.x()
+        ys = np.sort(boxes[:, [1, 3]], axis=1) * rect.height() + rect.y()
+
+        for (x0, x1), (y0, y1), label in zip(xs, ys, self.table.label[rows]):
+            component = label_map[label]
+            painter.setPen(QPen(self.get_color(component), 2))
+            painter.drawRect(QRectF(x0, y0, x1 - x0, y1 - y0))
+            painter.drawText(QPoint(int(x0) + 2, int(y0) - 4), component)
+
+
+# Lists the segments of every component and which components are present in a time range.
+# Double-clicking a segment jumps to its start.
+class SegmentsDialog(QDialog):
+    jump_requested = pyqtSignal(int)  # frame
+    export_requested = pyqtSignal(object)  # [(component, first frame, last frame)] of the selected rows
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Segments")
+        self.resize(480, 420)
+        self.segment_index = None
+        self.video_index = None
+        layout = QVBoxLayout(self)
+
+        self.table = QTableWidget(0, 4, self)
+        self.table.setHorizontalHeaderLabels(["Component", "Start", "End", "Duration (s)"])
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.cellDoubleClicked.connect(self.jump_to_row)
+        layout.addWidget(self.table)
+
+        # Components present between two times
+        range_layout = QHBoxLayout()
+        self.range_start_box = QDoubleSpinBox(self)
+        self.range_end_box = QDoubleSpinBox(self)
+        for text, box in [("From (s)", self.range_start_box), ("to (s)", self.range_end_box)]:
+            box.setDecimals(1)
+            box.valueChanged.connect(self.update_range)
+            range_layout.addWidget(QLabel(text, self))
+            range_layout.addWidget(box)
+        layout.addLayout(range_layout)
+        self.range_label = QLabel(self)
+        layout.addWidget(self.range_label)
+
+        export_button = QPushButton("Export Selected...", self)
+        export_button.clicked.connect(self.export_selected)
+        layout.addWidget(export_button)
+
+    def set_segments(self, segment_index, video_index):
+        self.segment_index = segment_index
+        self.video_index = video_index
+        rows = [(component, first, last) for component in segment_index.components()
+                for first, last in segment_index.segments(component)]
+
+        self.table.setRowCount(len(rows))
+        for row, (component, first, last) in enumerate(rows):
+            start_ms, end_ms = video_index.frame_to_ms(first), video_index.frame_to_ms(last) + 1000 / video_index.fps
+            for column, text in enumerate([component, format_time(start_ms), format_time(end_ms), f"{(end_ms - start_ms) / 1000:.1f}"]):
+                item = QTableWidgetItem(text)
+                item.setData(Qt.UserRole, first)
+                item.setData(Qt.UserRole + 1, last)
+                self.table.setItem(row, column, item)
+
+        duration = video_index.duration_ms / 1000
+        for box in (self.range_start_box, self.range_end_box):
+            box.setMaximum(duration)
+        self.update_range()
+
+    def jump_to_row(self, row, column):
+        self.jump_requested.emit(self.table.item(row, 0).data(Qt.UserRole))
+
+    def export_selected(self):
+        rows = sorted({index.row() for index in self.table.selectedIndexes()})
+        segments = [(self.table.item(row, 0).text(), self.table.item(row, 0).data(Qt.UserRole),
+                     self.table.item(row, 0).data(Qt.UserRole + 1)) for row in rows]
+        if segments:
+            self.export_requested.emit(segments)
+
+    def update_range(self):
+        if self.segment_index is None:
+            return
+        first = self.video_index.ms_to_frame(self.range_start_box.value() * 1000)
+        last = self.video_index.ms_to_frame(self.range_end_box.value() * 1000)
+        present = self.segment_index.components_in_range(first, last)
+        self.range_label.setText("Present: " + (", ".join(present) if present else "none"))
+
+
+# Options of a bulk export: which components (or the given segments), stills or clips and the source video
+class ExportDialog(QDialog):
+    def __init__(self, segment_index, segments=None, has_raw_video=False, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Export Segments")
+        self.segment_index = segment_index
+        self.segments = segments  # exported as they are when given, else every segment of the checked components
+        layout = QFormLayout(self)
+
+        if segments is None:
+            self.component_list = QListWidget(self)
+            for component in segment_index.components():
+                item = QListWidgetItem(f"{component} ({len(segment_index.segments(component))} segments)")
+                item.setData(Qt.UserRole, component)
+                item.setCheckState(Qt.Checked)
+                self.component_list.addItem(item)
+            layout.addRow("Components", self.component_list)
+        else:
+            layout.addRow("Segments", QLabel(f"{len(segments)} selected", self))
+
+        self.mode_box = QComboBox(self)
+        self.mode_box.addItems(["Annotated stills", "Video clips"])
+        layout.addRow("Export", self.mode_box)
+        self.stills_box = QSpinBox(self)
+        self.stills_box.setRange(1, 10000)
+        self.stills_box.setValue(ExportSettings().stills_per_segment)
+        layout.addRow("Stills per segment", self.stills_box)
+        self.padding_box = QSpinBox(self)
+        self.padding_box.setRange(0, 100000)
+        layout.addRow("Clip padding (frames)", self.padding_box)
+        self.annotate_box = QCheckBox("Draw bounding boxes", self, checked=True)
+        layout.addRow(self.annotate_box)
+        self.raw_box = QCheckBox("From the raw (unfiltered) video", self, checked=has_raw_video)
+        self.raw_box.setEnabled(has_raw_video)
+        layout.addRow(self.raw_box)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel, parent=self)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+
+    def export_settings(self):
+        return ExportSettings('stills' if self.mode_box.currentIndex() == 0 else 'clips', self.stills_box.value(),
+                              self.padding_box.value(), self.annotate_box.isChecked())
+
+    def selected_segments(self):
+        if self.segments is not None:
+            return self.segments
+        components = [self.component_list.item(row).data(Qt.UserRole) for row in range(self.component_list.count())
+                      if self.component_list.item(row).checkState() == Qt.Checked]
+        return [(component, int(first), int(last)) for component in components
+                for first, last in self.segment_index.segments(component)]
+
+
+# mm:ss.s for the segment list
+def format_time(ms):
+    minutes, seconds = divmod(ms / 1000, 60)
+    return f"{int(minutes):02d}:{seconds:04.1f}"
+
+
+# Floating window with the profiler's timers and counters, refreshed twice a second
+class ProfilerWindow(QLabel):
+    def __init__(self, parent=None):
+        super().__init__(parent, Qt.Tool)
+        self.setWindowTitle("Performance")
+        self.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        self.setAlignment(Qt.AlignLeft | Qt.AlignTop)
+        self.setMargin(8)
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(500)
+        self.refresh_timer.timeout.connect(self.refresh)
+
+    def refresh(self):
+        self.setText(profiler.report())
+        self.adjustSize()
+
+    def showEvent(self, event):
+        self.refresh()
+        self.refresh_timer.start()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.refresh_timer.stop()
+        super().hideEvent(event)
+
+
+# Forwards VLC's player events, which arrive on VLC's own threads, to the Qt main thread as signals
+class PlaybackEvents(QObject):
+    time_changed = pyqtSignal(int)  # playback position in ms
+    end_reached = pyqtSignal()
+
+    def __init__(self, media_player, parent=None):
+        super().__init__(parent)
+        import vlc
+        event_manager = media_player.event_manager()
+        event_manager.event_attach(vlc.EventType.MediaPlayerTimeChanged, self.on_time_changed)
+        event_manager.event_attach(vlc.EventType.MediaPlayerEndReached, self.on_end_reached)
+
+    def on_time_changed(self, event):
+        self.time_changed.emit(event.u.new_time)
+
+    def on_end_reached(self, event):
+        self.end_reached.emit()
+
+
+# Non-modal dialog for tuning the sparse-detection filter while looking at the timeline
+class FilterSettingsDialog(QDialog):
+    settings_changed = pyqtSignal(object)  # FilterSettings
+
+    def __init__(self, settings, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Filter Settings")
+        layout = QFormLayout(self)
+
+        self.window_box = self.add_spin_box(layout, "Window (frames)", settings.window, 1)
+        self.stride_box = self.add_spin_box(layout, "Stride (frames)", settings.stride, 1)
+        self.min_hits_box = self.add_spin_box(layout, "Min. detections per window", settings.min_hits, 0)
+        self.min_total_box = self.add_spin_box(layout, "Min. detections per component", settings.min_total, 0)
+
+    def add_spin_box(self, layout, text, value, minimum):
+        spin_box = QSpinBox(self)
+        spin_box.setRange(minimum, 1000000)
+        spin_box.setValue(value)
+        spin_box.valueChanged.connect(self.emit_settings)
+        layout.addRow(text, spin_box)
+        return spin_box
+
+    def emit_settings(self):
+        self.settings_changed.emit(FilterSettings(self.window_box.value(), self.stride_box.value(),
+                                                  self.min_hits_box.value(), self.min_total_box.value()))
+
+
+# Filters the full detection table off the Qt main thread and builds what the timeline and the segment
+# navigation show, so tuning the filter settings does not stall playback
+class DetectionFilter(QThread):
+    filtered = pyqtSignal(object, object, object)  # filtered DetectionTable, {component: frames}, SegmentIndex
+
+    def __init__(self, table, frame_count, filter_settings, parent=None):
+        super().__init__(parent)
+        self.table = table
+        self.frame_count = frame_count
+        self.filter_settings = filter_settings
+
+    def run(self):
+        keep = filter_mask(self.table, self.frame_count, self.filter_settings)
+        if self.isInterruptionRequested():
+            return
+        table = self.table.subset(keep)
+        if self.isInterruptionRequested():
+            return
+        self.filtered.emit(table, table.components(), SegmentIndex(table))
+
+
+# Parses a detection file off the Qt main thread, sending partial results while it reads
+class DetectionLoader(QThread):
+    progress = pyqtSignal(int)      # percentage of the file parsed
+    partial = pyqtSignal(object)    # {component: set of frames} parsed since the last signal
+    loaded = pyqtSignal(object, object)  # the full and the filtered DetectionTable when parsing is done
+    failed = pyqtSignal(str)
+    partial_interval = 0.25         # seconds between partial updates
+
+    def __init__(self, filename, frame_count, filter_settings, parent=None):
+        super().__init__(parent)
+        self.filename = filename
+        self.frame_count = frame_count
+        self.filter_settings = filter_settings
+        self.last_percent = -1
+
+    def report_progress(self, fraction):
+        percent = int(fraction * 100)
+        if percent != self.last_percent:
+            self.last_percent = percent
+            self.progress.emit(percent)
+
+    def run(self):
+        # Reopening a file maps the cached arrays in instead of parsing the JSON again
+        cached = load_cache(self.filename, self.frame_count, self.filter_settings)
+        if cached is not None:
+            table, keep = cached
+            self.progress.emit(100)
+        else:
+            try:
+                table, keep = self.parse(), None
+            except (OSError, ValueError, KeyError) as e:  # unreadable, truncated or malformed file
+                self.failed.emit(str(e))
+                return
+            if table is None:
+                return
+
+        if keep is None:
+            keep = filter_mask(table, self.frame_count, self.filter_settings)
+            save_cache(self.filename, table, keep, self.frame_count, self.filter_settings)
+
+        filtered = table.subset(keep)
+        print_filter_summary(table, filtered)
+        self.loaded.emit(table, filtered)
+
+    # Streams the JSON into a DetectionTable, returns None when interrupted
+    @profiler.timed('json load')
+    def parse(self):
+        builder = DetectionTableBuilder()
+        batch = defaultdict(set)
+        last_emit = time.monotonic()
+
+        for item in iter_detections(self.filename, progress=self.report_progress):
+            if self.isInterruptionRequested():
+                return None
+            builder.append(item)
+            batch[label_map[int(item["label"])]].add(item["frame_number"])
+
+            if time.monotonic() - last_emit > self.partial_interval:
+                self.partial.emit(batch)
+                batch = defaultdict(set)
+                last_emit = time.monotonic()
+
+        if batch:
+            self.partial.emit(batch)
+        table = builder.build()
+        table.compute_stats()  # here on the loader thread, the cache may not be writable
+        return table
+
+
+# Decodes the thumbnail atlas of a video in the background, resuming a previous partial run
+class ThumbnailBuilder(QThread):
+    progress = pyqtSignal(int, int)  # thumbnails done, thumbnails in total
+
+    def __init__(self, video_path, video_index, atlas, parent=None):
+        super().__init__(parent)
+        self.video_path = video_path
+        self.video_index = video_index
+        self.atlas = atlas
+
+    def run(self):
+        try:
+            build_thumbnails(self.video_path, self.video_index, self.atlas, cancelled=self.isInterruptionRequested,
+                             progress=self.progress.emit)
+        except (OSError, ValueError) as e:
+            print(f"Could not build thumbnails of {self.video_path}: {e}")
+
+
+# Scans a video for its frame index off the Qt main thread, without PyAV the scan decodes every frame
+class VideoIndexer(QThread):
+    indexed = pyqtSignal(str, object)  # video path, VideoIndex or None when the file could not be read
+
+    def __init__(self, video_path, parent=None):
+        super().__init__(parent)
+        self.video_path = video_path
+
+    def run(self):
+        index = load_video_index(self.video_path, cancelled=self.isInterruptionRequested)
+        if not self.isInterruptionRequested():
+            self.indexed.emit(self.video_path, index)
+
+
+# Runs a bulk export off the Qt main thread
+class SegmentExporter(QThread):
+    progress = pyqtSignal(int, int)  # frames done, frames in total
+    exported = pyqtSignal(object)    # written paths, or an error message
+
+    def __init__(self, video_path, video_index, table, segments, output_dir, settings, colors, parent=None):
+        super().__init__(parent)
+        self.arguments = (video_path, video_index, table, segments, output_dir, settings, colors)
+
+    def run(self):
+        try:
+            paths = export_segments(*self.arguments, cancelled=self.isInterruptionRequested, progress=self.progress.emit)
+        except (OSError, ValueError) as e:
+            self.exported.emit(str(e))
+            return
+        self.exported.emit(paths)
+
+
+# Follows a detection file that is still being written: parses only the appended records every
+# poll_interval and extends the table and its filter mask instead of recomputing them
+class DetectionFollower(QThread):
+    updated = pyqtSignal(object, object, int)  # full table, filtered table, first frame whose detections changed
+    failed = pyqtSignal(str)
+    poll_interval = 250  # ms
+
+    def __init__(self, filename, frame_count, filter_settings, parent=None):
+        super().__init__(parent)
+        self.filename = filename
+        self.frame_count = frame_count
+        self.filter_settings = filter_settings
+        self.pending_filter = None  # (frame_count, FilterSettings) to apply on the next poll
+
+    def set_filter(self, frame_count, filter_settings):
+        self.pending_filter = (frame_count, filter_settings)
+
+    def run(self):
+        tail = DetectionTail(self.filename)
+        table, keep = DetectionTable.empty(), np.ones(0, dtype=bool)
+        table.compute_stats()
+        filtered = table
+        while not self.isInterruptionRequested():
+            # A file that is far ahead is read chunk by chunk into one builder, so only one chunk of
+            # JSON text is in memory and the table is extended once per poll
+            builder, restarted = DetectionTableBuilder(), False
+            deadline = time.monotonic() + self.poll_interval / 1000
+            try:
+                while True:
+                    items, chunk_restarted = tail.read_new()
+                    if chunk_restarted:
+                        builder, restarted = DetectionTableBuilder(), True
+                    for item in items:
+                        builder.append(item)
+                    if tail.caught_up or time.monotonic() > deadline or self.isInterruptionRequested():
+                        break
+            except (OSError, ValueError) as e:
+                self.failed.emit(str(e))
+                return
+            pending, self.pending_filter = self.pending_filter, None
+            if restarted:
+                table, keep = DetectionTable.empty(), np.ones(0, dtype=bool)
+                table.compute_stats()
+                filtered = table
+
+            if len(builder) or restarted or pending is not None:
+                new_rows = builder.build()
+                new_rows.compute_stats()  # extend() merges it into the stats of the table
+                if pending is not None:
+                    self.frame_count, self.filter_settings = pending
+
+                if len(new_rows) and pending is None and table.appends(new_rows):
+                    table = table.extend(new_rows)
+                    keep, first_changed = update_filter_mask(table, keep, self.frame_count, self.filter_settings,
+                                                             int(new_rows.frame[0]))
+                    filtered = refilter_tail(filtered, table, keep, first_changed)
+                else:
+                    # records out of frame order or new filter settings
+                    table = table.extend(new_rows)
+                    keep, first_changed = filter_mask(table, self.frame_count, self.filter_settings), 0
+                    filtered = table.subset(keep)
+                self.updated.emit(table, filtered, first_changed)
+            if tail.caught_up:
+                self.msleep(self.poll_interval)
+
+
+# Pairs the videos and detection files of a folder and builds their caches in a process pool
+class SessionBuilder(QThread):
+    progress = pyqtSignal(int, int)  # dives done, dives in total
+    built = pyqtSignal(object)       # list of dive summaries, see session.summarize_pair
+
+    def __init__(self, pairs, filter_settings, parent=None):
+        super().__init__(parent)
+        self.pairs = pairs
+        self.filter_settings = filter_settings
+
+    def run(self):
+        summaries = build_session(self.pairs, self.filter_settings, progress=self.progress.emit,
+                                  cancelled=self.isInterruptionRequested)
+        if summaries is not None:
+            self.built.emit(summaries)
 
-        pos = 100
-        back_side = 85
-        space_size = 30
-        vertical_offset = 15
 
-        # Calculate the width of one frame in pixels
-        frame_width = (self.width() - pos - back_side) / (self.frame_count + 1)
-        detect_dic = {}
-        counter = 0
-        
-        # Draw colored rectangles for each component detected in each frame
-        for n, (component, frames) in enumerate(self.detections.items()):
-            detect_dic[component] = frames
-        
-        for comp in self.component_names:
-            if comp in detect_dic:
-                i = counter
-                color = self.get_color_for_component(comp)
-                for frame in detect_dic[comp]:
-                    painter.setPen(QPen(color, 1))
-                    painter.drawLine(int((frame * frame_width) + pos), int(i * space_size + vertical_offset), int((frame * frame_width) + pos), int((i * space_size) + vertical_offset + 10))
-                counter += 1
-               
 # creating main GUI window, displaying video etc.
 class VideoPlayerWindow(QMainWindow):
     component_names = ['Anchor', 'Buoy', 'Chain', 'Fiber thimple', 'H-link', 'Rope', 'Shackle', 'Triplate', 'Wire', 'Wire socket']
+    max_extrapolation = 1.0  # seconds the playback position runs on without a time event from VLC
     
     def __init__(self):
         super().__init__()
@@ -166,6 +974,7 @@ class VideoPlayerWindow(QMainWindow):
         self.create_video_viewer()
         self.create_video_controls()
         self.setup_timeline()
+        self.create_detection_overlay()
         self.initialize_variables()
         self.adjust_video_speed(1)
         
@@ -175,6 +984,9 @@ class VideoPlayerWindow(QMainWindow):
         self.player_layout.addWidget(self.raw_frame_button)
 
         self.show()
+        if profiler.enabled:
+            self.toggle_profiler(True)
+        QTimer.singleShot(0, self.start_vlc)
 
     def create_menus(self):
         menubar = self.menuBar()
@@ -195,6 +1007,60 @@ class VideoPlayerWindow(QMainWindow):
         upload_json_action.triggered.connect(self.upload_json)
         file_menu.addAction(upload_json_action)
 
+        # Create 'Follow JSON' actions for detection files that are still being written
+        follow_json_action = QAction('Follow JSON...', self)
+        follow_json_action.triggered.connect(self.follow_json)
+        file_menu.addAction(follow_json_action)
+        stop_following_action = QAction('Stop Following', self)
+        stop_following_action.triggered.connect(self.stop_following)
+        file_menu.addAction(stop_following_action)
+
+        # Create 'Export Segments' action for writing stills or clips of the segments
+        export_action = QAction('Export Segments...', self)
+        export_action.triggered.connect(lambda: self.export_segments())
+        file_menu.addAction(export_action)
+
+        # Create 'Filter Settings' action for tuning the sparse-detection filter
+        filter_menu = menubar.addMenu('Filter')
+        filter_settings_action = QAction('Filter Settings...', self)
+        filter_settings_action.triggered.connect(self.show_filter_settings)
+        filter_menu.addAction(filter_settings_action)
+
+        # Create 'Navigate' actions for jumping between the segments of a component
+        navigate_menu = menubar.addMenu('Navigate')
+        next_segment_action = QAction('Next Segment', self, shortcut='Ctrl+Right')
+        next_segment_action.triggered.connect(self.jump_to_next_segment)
+        navigate_menu.addAction(next_segment_action)
+        previous_segment_action = QAction('Previous Segment', self, shortcut='Ctrl+Left')
+        previous_segment_action.triggered.connect(self.jump_to_previous_segment)
+        navigate_menu.addAction(previous_segment_action)
+        segments_action = QAction('Segments...', self)
+        segments_action.triggered.connect(self.show_segments)
+        navigate_menu.addAction(segments_action)
+
+        # Create 'Detection Overlay' action for showing the boxes on the video
+        view_menu = menubar.addMenu('View')
+        self.overlay_action = QAction('Detection Overlay', self, checkable=True, checked=True)
+        self.overlay_action.toggled.connect(self.toggle_detection_overlay)
+        view_menu.addAction(self.overlay_action)
+
+        # Create 'Performance' actions for timing the hot paths
+        self.profiler_action = QAction('Performance Overlay', self, checkable=True, checked=profiler.enabled)
+        self.profiler_action.toggled.connect(self.toggle_profiler)
+        view_menu.addAction(self.profiler_action)
+        dump_profile_action = QAction('Save Performance Stats...', self)
+        dump_profile_action.triggered.connect(self.save_profile)
+        view_menu.addAction(dump_profile_action)
+
+        # Create 'Statistics Lane' menu for a heatmap of per-frame statistics below the timeline
+        stats_menu = view_menu.addMenu('Statistics Lane')
+        stats_group = QActionGroup(self)
+        for metric in [None] + DetectionsTimeline.stats_metrics:
+            action = QAction(metric or 'Off', self, checkable=True, checked=metric is None)
+            action.triggered.connect(lambda checked, metric=metric: self.set_stats_metric(metric))
+            stats_group.addAction(action)
+            stats_menu.addAction(action)
+
         # Set the geometry and stylesheet of the menubar
         menubar.setGeometry(0, 0, self.width(), menubar.height())  
         menubar.setStyleSheet("QMenuBar{spacing: 100px;}") 
@@ -214,16 +1080,28 @@ class VideoPlayerWindow(QMainWindow):
         self.layout.addLayout(self.video_control_layout)
 
     def create_video_viewer(self):
-        self.instance = vlc.Instance('--noaudio')
-        self.media_player = self.instance.media_player_new()
-        fps = self.media_player.get_fps()
-        fps = round(fps, 3)
-        print(f'Fps: {fps}')
+        self.instance = None
+        self.media_player = None  # created by start_vlc once the window is shown
         self.video_view = QWidget(self)
-        self.media_player.set_hwnd(self.video_view.winId())
         self.video_control_layout.addWidget(self.video_view)
         self.video_view.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)  # Expandable video
 
+    # Creating the VLC instance scans VLC's plugins, which is slow, so it is done after the window
+    # appears (or earlier, when a video is opened before that)
+    def start_vlc(self):
+        if self.media_player is not None:
+            return
+        import vlc
+        self.instance = vlc.Instance('--noaudio')
+        self.media_player = self.instance.media_player_new()
+        self.media_player.set_hwnd(self.video_view.winId())
+        self.media_player.set_rate(self.video_speed)
+
+        # Playhead, slider and time label follow VLC's events instead of polling the player
+        self.playback_events = PlaybackEvents(self.media_player, self)
+        self.playback_events.time_changed.connect(self.on_time_changed)
+        self.playback_events.end_reached.connect(self.on_end_reached)
+
     def create_video_controls(self):
         self.player_frame = QFrame(self)
         self.player_layout = QHBoxLayout(self.player_frame)
@@ -236,7 +1114,15 @@ class VideoPlayerWindow(QMainWindow):
         self.timeline = QSlider(Qt.Horizontal)
         self.timeline.setTickPosition(QSlider.TicksAbove)
         self.timeline.setTickInterval(1)
+        self.timeline.valueChanged.connect(self.update_frame)
         self.player_layout.addWidget(self.timeline)
+        self.slider_preview = SliderPreview(self.timeline)
+
+        # Component the segment navigation jumps between
+        self.segment_component_combobox = QComboBox(self)
+        self.segment_component_combobox.addItems(["All components"] + self.component_names)
+        self.segment_component_combobox.setToolTip("Component for Navigate > Next/Previous Segment")
+        self.player_layout.addWidget(self.segment_component_combobox)
 
         self.video_speed_combobox = QComboBox(self)
         self.video_speed_combobox.addItems(["1x", "2x", "4x", "8x", "16x"])
@@ -245,51 +1131,143 @@ class VideoPlayerWindow(QMainWindow):
 
     def setup_timeline(self):
         self.visual_timeline = DetectionsTimeline(self)
+        self.thumbnail_strip = ThumbnailStrip(self.visual_timeline, self)
+        self.layout.addWidget(self.thumbnail_strip)
         self.layout.addWidget(self.visual_timeline)
 
+    # Bounding boxes of the current frame drawn on top of the video
+    def create_detection_overlay(self):
+        self.detection_overlay = DetectionOverlay(self.video_view, self.visual_timeline.get_color_for_component, self)
+        self.detection_overlay.show()
+
+    def toggle_detection_overlay(self, checked):
+        self.detection_overlay.setVisible(checked)
+
+    # Showing the overlay turns the timers on, they stay on until it is closed again
+    def toggle_profiler(self, checked):
+        profiler.enabled = checked
+        if checked:
+            if self.profiler_window is None:
+                self.profiler_window = ProfilerWindow(self)
+            self.profiler_window.show()
+        elif self.profiler_window is not None:
+            self.profiler_window.hide()
+
+    def save_profile(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Save Performance Stats", "profile.json", "JSON Files (*.json)")
+        if path:
+            profiler.dump(path)
+
     def initialize_variables(self):
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_video)
+        # Refreshes the UI every display frame while playing. While paused it coalesces VLC's time events
+        # (e.g. after a seek) so the UI is refreshed at most once per display frame.
+        refresh_rate = QApplication.primaryScreen().refreshRate() or 60
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setSingleShot(True)
+        self.refresh_timer.setInterval(int(1000 / refresh_rate))
+        self.refresh_timer.timeout.connect(self.update_video)
+        self.video_time = 0  # latest playback position reported by VLC, in ms
+        self.video_time_clock = time.monotonic()  # when video_time was reported or set
+        self.playing = False
+        self.total_time = "00:00"
         self.video_path = None
         self.frame_count = 0
         self.current_frame = 0
+        self.video_index = VideoIndex([], [0], 25)  # replaced by the index of the loaded video
         self.detections = {}
+        self.raw_detection_table = DetectionTable.empty()  # every detection in the file, before filtering
+        self.detection_table = DetectionTable.empty()
+        self.detection_loader = None
+        self.detection_filter = None   # DetectionFilter applying new filter settings
+        self.filter_pending = False    # settings changed while it ran, filter again when it is done
+        self.detection_follower = None
+        self.filter_settings = FilterSettings()
+        self.filter_dialog = None
+        self.frame_server = None  # RawFrameServer for the "No filter (Image)" viewer
+        self.image_window = None
+        self.session_builder = None
+        self.session_dock = None
+        self.unmatched_jsons = []  # detection files of the folder that no video was paired with
+        self.segment_index = SegmentIndex(self.detection_table)
+        self.segments_dialog = None
+        self.thumbnail_builder = None
+        self.video_indexer = None      # VideoIndexer of the loaded video
+        self.raw_video_indexer = None  # VideoIndexer of its raw video
+        self.segment_exporter = None
+        self.profiler_window = None
         self.last_frame_time = QDateTime.currentDateTime()
     
     def process_video(self, video_path):
+        self.start_vlc()
         self.media = self.instance.media_new(video_path)
         self.media.parse()
         self.media_player.set_media(self.media)
-        fps = self.media_player.get_fps()
-        frame_duration = round(1000 / fps, 3)
-        print(frame_duration)
-        self.frame_count = int(self.media.get_duration() // frame_duration) # !!!!!!!!!!!Get duration in seconds(Might be wrong to do this; should be 1000)
+
+        # Exact frame count and frame timestamps from the cached demux scan of the file. The first time
+        # the file is scanned in the background and VLC's frame rate stands in until the scan is done.
+        self.stop_indexing()
+        video_index = cached_video_index(video_path)
+        if video_index is None:
+            fps = self.media_player.get_fps() or 25
+            video_index = VideoIndex.constant_rate(fps, self.media.get_duration())
+            self.video_indexer = VideoIndexer(video_path, self)
+            self.video_indexer.indexed.connect(self.on_video_indexed)
+            self.video_indexer.start(QThread.LowPriority)
+        self.detection_overlay.set_video_size(0, 0)  # read from VLC once the new video plays
         self.timeline.setMinimum(0)
-        self.timeline.setMaximum(self.frame_count - 1)
+        self.set_video_index(video_index)
         self.timeline.setValue(0)
-        self.timeline.valueChanged.connect(self.update_frame)
+        self.start_thumbnails(video_path)
+        self.set_playing(False)  # set_media stops the player
+        self.video_time, self.video_time_clock = 0, time.monotonic()
+        self.update_video()
+
+        self.close_frame_server()  # the raw video belongs to the previous video
+        self.video_path = video_path  # store the video path in the instance variable
+        self.raw_frame_button.setEnabled(True)  # enable the button when a video is loaded
+       
+
+    # Frame count and timing of the loaded video, set again when its background scan is done
+    def set_video_index(self, video_index):
+        self.video_index = video_index
+        print(f'Fps: {round(self.video_index.fps, 3)}')
+        self.frame_count = self.video_index.frame_count
+        self.timeline.setMaximum(self.frame_count - 1)
         self.visual_timeline.set_frame_count(self.frame_count)
-        self.timer.timeout.connect(self.update_video)  # Connect timer's timeout signal to update_video method
+        self.apply_filter()  # the sliding windows depend on the frame count
+        if self.segments_dialog is not None:
+            self.segments_dialog.set_segments(self.segment_index, self.video_index)
 
         # Calculate the total time in minutes and seconds
-        total_time_seconds = self.frame_count / self.media_player.get_fps()
+        total_time_seconds = self.video_index.duration_ms / 1000
         total_minutes, total_seconds = divmod(total_time_seconds, 60)
         # Set the total time
         self.total_time = f"{int(total_minutes):02d}:{int(total_seconds):02d}"
 
-        # Start the timer and set its interval to the frame duration
-        self.timer.start(int(frame_duration))
-
-        self.video_path = video_path  # store the video path in the instance variable
-        self.raw_frame_button.setEnabled(True)  # enable the button when a video is loaded
-       
+    def on_video_indexed(self, video_path, video_index):
+        if self.sender() is not self.video_indexer:
+            return
+        self.video_indexer = None
+        if video_index is not None:
+            self.set_video_index(video_index)
+            self.update_video()
+        self.start_thumbnails(video_path)  # the thumbnails were waiting for the keyframes
+
+    def stop_indexing(self):
+        if self.video_indexer is not None:
+            self.video_indexer.requestInterruption()
+            self.video_indexer.wait()
+            self.video_indexer = None
 
     def update_frame(self, frame_idx):
-        fps = self.media_player.get_fps()
-        frame_duration = int(1000 / fps)
         self.current_frame = frame_idx
         self.timeline.setValue(self.current_frame)
-        self.media_player.set_time(frame_idx * frame_duration)  
+        self.visual_timeline.set_current_frame(self.current_frame)
+        self.detection_overlay.set_frame(self.current_frame)
+        self.video_time = int(round(self.video_index.frame_to_ms(frame_idx)))
+        self.video_time_clock = time.monotonic()
+        if self.media_player is not None:
+            self.media_player.set_time(self.video_time)
 
     
     # Uploading video and changing button layout if video uploaded
@@ -302,27 +1280,57 @@ class VideoPlayerWindow(QMainWindow):
             self.process_video(video_path)
             self.sender().setText('Video Uploaded') 
 
-    def update_video(self):
-        fps = self.media_player.get_fps()
-        frame_duration = int(1000 / fps)
-        if self.media_player.get_state() == vlc.State.Ended:
-            self.media_player.stop()  # Stop the video
-            self.media_player.play()  # Start the video from the beginning
-            self.current_frame = 0  # Reset current frame to the beginning
-            self.timeline.setValue(self.current_frame)  # Reset timeline to the beginning
-            
+    def on_time_changed(self, time_ms):
+        self.video_time = time_ms
+        self.video_time_clock = time.monotonic()
+        if not self.refresh_timer.isActive():
+            self.refresh_timer.start()
+
+    def on_end_reached(self):
+        self.media_player.stop()  # Stop the video
+        self.media_player.play()  # Start the video from the beginning
+        self.video_time, self.video_time_clock = 0, time.monotonic()  # Reset to the beginning
+        self.update_video()
+
+    # VLC reports the time only every few hundred ms, so while playing the position runs on from the
+    # last report at the playback rate
+    def playback_time(self):
+        if not self.playing:
+            return self.video_time
+        elapsed = min(time.monotonic() - self.video_time_clock, self.max_extrapolation)
+        return self.video_time + elapsed * 1000 * self.video_speed
+
+    def set_playing(self, playing):
+        self.video_time, self.video_time_clock = self.playback_time(), time.monotonic()
+        self.playing = playing
+        self.refresh_timer.setSingleShot(not playing)
+        if playing:
+            self.refresh_timer.start()
         else:
-            self.current_frame = self.media_player.get_time() // frame_duration
-            self.timeline.blockSignals(True)  # Block signals to prevent feedback loop
-            self.timeline.setValue(self.current_frame)
-            self.timeline.blockSignals(False)  # Unblock signals
+            self.refresh_timer.stop()
+            self.update_video()
+
+    # Moves the slider, playhead, overlay and time label to the current playback position
+    @profiler.timed('update_video')
+    def update_video(self):
+        self.current_frame = self.video_index.ms_to_frame(self.playback_time())
+        self.timeline.blockSignals(True)  # Block signals to prevent feedback loop
+        self.timeline.setValue(self.current_frame)
+        self.timeline.blockSignals(False)  # Unblock signals
+
+        self.visual_timeline.set_current_frame(self.current_frame)
+        if not self.detection_overlay.video_size[0] and self.media_player is not None:
+            self.detection_overlay.set_video_size(*(self.media_player.video_get_size(0) or (0, 0)))
+        self.detection_overlay.set_frame(self.current_frame)
 
         # Calculate the current time in minutes and seconds
-        current_time_seconds = self.current_frame / self.media_player.get_fps()
+        current_time_seconds = self.video_index.frame_to_ms(self.current_frame) / 1000
         current_minutes, current_seconds = divmod(current_time_seconds, 60)
 
-        # Update the time label
-        self.time_label.setText(f"{int(current_minutes):02d}:{int(current_seconds):02d} / {self.total_time}     ")
+        # Update the time label, only when the text changes
+        time_text = f"{int(current_minutes):02d}:{int(current_seconds):02d} / {self.total_time}     "
+        if time_text != self.time_label.text():
+            self.time_label.setText(time_text)
 
         
     def upload_folder(self):
@@ -332,121 +1340,172 @@ class VideoPlayerWindow(QMainWindow):
         folder_path = dialog.getExistingDirectory(self, "Select Folder")
 
         if folder_path:
-            video_files = [f for f in listdir(folder_path) if isfile(join(folder_path, f)) and f.endswith((".mp4", ".avi", ".vob", ".mpg"))]
-            json_files = [f for f in listdir(folder_path) if isfile(join(folder_path, f)) and f.endswith(".json")]
-
-            if video_files and json_files:
-                video_path = join(folder_path, video_files[0])
-                json_path = join(folder_path, json_files[0])
-
-                self.process_video(video_path)
-                self.handle_json_selected(json_path)
+            # Every video in the folder with its detection file, summarized in the background
+            pairs, self.unmatched_jsons = pair_files(folder_path)
+            if pairs and self.session_builder is None:
+                self.session_builder = SessionBuilder(pairs, self.filter_settings, self)
+                self.session_builder.progress.connect(
+                    lambda done, total: self.statusBar().showMessage(f"Indexing dives... {done}/{total}"))
+                self.session_builder.built.connect(self.on_session_built)
+                self.session_builder.start()
                 self.sender().setText('Folder Uploaded')
+
+    # Lists the dives of the folder in a dock, selecting one switches video and detections from the caches
+    def on_session_built(self, summaries):
+        self.session_builder = None
+        self.statusBar().showMessage(f"{len(summaries)} dives indexed", 3000)
+
+        if self.session_dock is None:
+            self.session_list = QListWidget(self)
+            self.session_list.currentItemChanged.connect(self.open_dive)
+            self.session_dock = QDockWidget("Session", self)
+            self.session_dock.setWidget(self.session_list)
+            self.addDockWidget(Qt.LeftDockWidgetArea, self.session_dock)
+        self.session_dock.show()
+
+        self.session_list.blockSignals(True)
+        self.session_list.clear()
+        for summary in summaries:
+            counts = ", ".join(f"{component} {final}" for component, (initial, final) in summary['counts'].items() if final)
+            if summary['error'] is not None:
+                counts = "detections could not be read"
+            item = QListWidgetItem(f"{basename(summary['video_path'])}\n  {counts or 'no detections'}")
+            item.setData(Qt.UserRole, summary)
+            self.session_list.addItem(item)
+        # Selecting one of these loads it for the video that is open
+        for json_path in self.unmatched_jsons:
+            item = QListWidgetItem(f"{basename(json_path)}\n  no matching video")
+            item.setData(Qt.UserRole, {'video_path': None, 'json_path': json_path, 'counts': {}})
+            self.session_list.addItem(item)
+        self.session_list.blockSignals(False)
+        self.session_list.setCurrentRow(0)
+
+    def open_dive(self, item, previous=None):
+        if item is not None:
+            summary = item.data(Qt.UserRole)
+            if summary['video_path'] is not None:
+                self.process_video(summary['video_path'])
+            if summary['json_path']:
+                self.handle_json_selected(summary['json_path'])
+            else:
+                self.stop_loading()
+                self.stop_following()
+                self.raw_detection_table = DetectionTable.empty()
+                self.set_detection_table(DetectionTable.empty())
     
     @pyqtSlot()
     def toggle_playback(self):
+        self.start_vlc()
         if self.media_player.is_playing():
             self.media_player.pause()
+            self.set_playing(False)
             self.start_pause_button.setText("Start")
             self.raw_frame_button.show()
+            # Decode the raw frames around the pause position before they are asked for
+            frame_server = self.get_frame_server()
+            if frame_server is not None:
+                frame_server.prefetch_around(self.current_frame)
         else:
             self.media_player.play()
+            self.set_playing(True)
             self.start_pause_button.setText("Pause")
             self.last_frame_time = QDateTime.currentDateTime()
             self.raw_frame_button.hide()
+            if self.frame_server is not None:
+                self.frame_server.cancel_prefetch()
             
 
     def adjust_video_speed(self, index):
         speed_options = [1, 2, 4, 8, 12]
         selected_speed = int(speed_options[int(index)])
+        self.video_time, self.video_time_clock = self.playback_time(), time.monotonic()
         self.video_speed = selected_speed
-        self.media_player.set_rate(self.video_speed)  # Set the rate (speed) of the media player'
+        if self.media_player is not None:
+            self.media_player.set_rate(self.video_speed)  # Set the rate (speed) of the media player'
+
+    # Opens the frame server for the raw video of the loaded video, when there is one
+    def get_frame_server(self):
+        if self.frame_server is None and self.video_path:
+            raw_video_path = self.video_path.replace(".mp4", "_Raw.mp4")
+            if isfile(raw_video_path):
+                from frame_server import RawFrameServer
+                # Seeks by frame number until the raw video has been scanned in the background
+                self.frame_server = RawFrameServer(raw_video_path, cached_video_index(raw_video_path))
+                if self.frame_server.video_index is None:
+                    self.raw_video_indexer = VideoIndexer(raw_video_path, self)
+                    self.raw_video_indexer.indexed.connect(self.on_raw_video_indexed)
+                    self.raw_video_indexer.start(QThread.LowPriority)
+        return self.frame_server
+
+    def on_raw_video_indexed(self, video_path, video_index):
+        if self.sender() is not self.raw_video_indexer:
+            return
+        self.raw_video_indexer = None
+        if video_index is not None and self.frame_server is not None:
+            self.frame_server.set_video_index(video_index)
+
+    def close_frame_server(self):
+        if self.raw_video_indexer is not None:
+            self.raw_video_indexer.requestInterruption()
+            self.raw_video_indexer.wait()
+            self.raw_video_indexer = None
+        if self.frame_server is not None:
+            self.frame_server.close()
+            self.frame_server = None
 
     @pyqtSlot()
     def show_raw_frame(self):
-        raw_video_path = self.video_path.replace(".mp4", "_Raw.mp4")
-        raw_cap = cv2.VideoCapture(raw_video_path)
-        raw_cap.set(cv2.CAP_PROP_POS_FRAMES, self.current_frame)
-        ret, frame = raw_cap.read()
-        if ret:
-            self.image_window = ImageWindow(frame)
-        raw_cap.release()
+        frame_server = self.get_frame_server()
+        if frame_server is None:
+            return
+        frame = frame_server.get_frame(self.current_frame)
+        if frame is not None:
+            # Reuse the open window so stepping and new clicks show up in the same place
+            if self.image_window is not None and self.image_window.isVisible():
+                self.image_window.set_frame(frame, self.current_frame)
+                self.image_window.raise_()
+            else:
+                self.image_window = ImageWindow(frame, frame_server, self.current_frame)
+            frame_server.prefetch_around(self.current_frame)
+
+    # Shows the cached thumbnails of the video at once and decodes the missing ones in the background
+    def start_thumbnails(self, video_path):
+        self.stop_thumbnails()
+        atlas = load_atlas(video_path)
+        self.thumbnail_strip.set_atlas(atlas)
+        self.slider_preview.set_atlas(atlas)
+        # the thumbnails sit on keyframes, so the missing ones are decoded once the video is indexed
+        if self.video_index.frame_count and self.video_indexer is None:
+            self.thumbnail_builder = ThumbnailBuilder(video_path, self.video_index, atlas, self)
+            self.thumbnail_builder.progress.connect(self.on_thumbnails_progress)
+            self.thumbnail_builder.start(QThread.LowPriority)  # playback comes first
+
+    def stop_thumbnails(self):
+        if self.thumbnail_builder is not None:
+            self.thumbnail_builder.requestInterruption()
+            self.thumbnail_builder.wait()
+            self.thumbnail_builder = None
+
+    def on_thumbnails_progress(self, done, total):
+        if self.sender() is self.thumbnail_builder:
+            self.thumbnail_strip.update()
+
+    def closeEvent(self, event):
+        if profiler.dump_path:
+            profiler.dump(profiler.dump_path)
+        self.stop_thumbnails()
+        self.stop_indexing()
+        self.stop_loading()
+        self.stop_following()
+        if self.segment_exporter is not None:
+            self.segment_exporter.requestInterruption()
+            self.segment_exporter.wait()
+        if self.session_builder is not None:
+            self.session_builder.requestInterruption()
+            self.session_builder.wait()
+        self.close_frame_server()
+        super().closeEvent(event)
 
-        
-
-#____________________________________________________________JSON______________________________________________________________________________________________
-
-# Detects information from the JSON file, and gives the different parameters the correct values
-    def load_detections(self, filename):
-        label_map = ['Anchor', 'Buoy', 'Chain', 'Fiber thimple', 'H-link', 'Rope', 'Shackle', 'Triplate', 'Wire', 'Wire socket']
-        with open(filename) as f:
-            data = json.load(f)
-
-        # Create a dictionary where the keys are the component names and the values are Counters of frame numbers.
-        detections = defaultdict(Counter)
-        for item in data:
-            frame_number = item["frame_number"]
-            label = label_map[int(item["label"])]
-            bbox = item["x_min"], item["y_min"], item["x_max"], item["y_max"]
-
-            detections[label][frame_number] += 1
-
-        # Create a copy of detections before any removals
-        initial_detections = {k: sum(v.values()) for k, v in detections.items() if sum(v.values()) > 0}
-
-        # Create a new dictionary with components that have more than 20 frames
-        detections = {k: v for k, v in detections.items() if sum(v.values()) > 20}
-
-        # for the remaining components, check the frame count in the range using sliding window
-        to_remove = set()
-        remove_counter = defaultdict(int) # count number of frames removed for each label
-
-        for label, frames in detections.items():
-            sorted_frames = sorted(frames.elements())
-            start_index = 0
-            end_index = 0
-            window_start = 0
-            window_end = 100
-
-            while window_end <= self.frame_count:
-                while end_index < len(sorted_frames) and sorted_frames[end_index] < window_end:
-                    end_index += 1
-                
-                window_frames = sorted_frames[start_index:end_index]
-                window_frame_count = len(window_frames)
-                
-                if window_frame_count < 5:
-                    # if less than 5 occurrences within the window, mark for removal
-                    for frame in window_frames:
-                        to_remove.add((label, frame))
-                        remove_counter[label] += 1  # increment counter
-
-                # slide the window forward by 50 frames
-                window_start += 50
-                window_end += 50
-                while start_index < len(sorted_frames) and sorted_frames[start_index] < window_start:
-                    start_index += 1
-
-        # remove frames that have less than 5 nearby occurrences
-        for label, frame in to_remove:
-            detections[label][frame] -= 1
-            if detections[label][frame] <= 0:
-                del detections[label][frame]
-
-        # remove components that have no frames left
-        detections = {k: v for k, v in detections.items() if v}
-
-        # Print the number of frames removed for each label
-        for label, initial_count in initial_detections.items():
-            final_count = sum(detections[label].values()) if label in detections else 0
-            removed_count = initial_count - final_count
-            print(f"Start_{label}: {initial_count} | End_{label}: {final_count} | Removed: {removed_count}")
-        
-        # Print a line of dashes after the labels
-        print("-------------------------")
-
-        return detections
-    
         # Uploads json file, updates detections in timeline, deletes previous timelines
     def upload_json(self):
         file_dialog = QFileDialog(self)
@@ -456,27 +1515,256 @@ class VideoPlayerWindow(QMainWindow):
 
     def handle_json_selected(self, json_path):
         if json_path:
-            detect_dic = {}
-            self.detections = self.load_detections(json_path)
-            self.load_detections(json_path)
-
-            self.visual_timeline.set_detections(self.detections)  # Update the detections in timeline
-
-            for label in self.visual_timeline.color_legend_labels:
-                label.deleteLater()
-            self.visual_timeline.color_legend_labels.clear()
-
-            for n, (component, frames) in enumerate(self.detections.items()):
-                detect_dic[component] = frames
-
-            # Create labels and timelines after the JSON file is read
-            for component in self.component_names:
-                if component in self.detections:  # Check if the component is in the JSON file
-                    color = self.visual_timeline.get_color_for_component(component)
-                    label = QLabel(component)
-                    self.visual_timeline.color_legend_layout.addWidget(label)
-                    self.visual_timeline.color_legend_labels.append(label)
-            self.visual_timeline.update()
+            # Stop a load that is still running before starting the next one
+            self.stop_loading()
+            self.stop_following()
+
+            self.raw_detection_table = DetectionTable.empty()
+            self.detection_table = DetectionTable.empty()
+            self.detections = defaultdict(set)
+            self.visual_timeline.set_detections(self.detections)
+            self.visual_timeline.set_stats(None)
+            self.detection_overlay.set_table(self.detection_table)
+            self.update_color_legend()
+
+            self.detection_loader = DetectionLoader(json_path, self.frame_count, self.filter_settings, self)
+            self.detection_loader.progress.connect(self.on_detections_progress)
+            self.detection_loader.partial.connect(self.on_detections_partial)
+            self.detection_loader.loaded.connect(self.on_detections_loaded)
+            self.detection_loader.failed.connect(self.on_detections_failed)
+            self.detection_loader.start()
+
+    # Stops loading and filtering the current detection file
+    def stop_loading(self):
+        if self.detection_loader is not None:
+            self.detection_loader.requestInterruption()
+            self.detection_loader.wait()
+            self.detection_loader = None
+        if self.detection_filter is not None:
+            self.detection_filter.requestInterruption()
+            self.detection_filter.wait()
+            self.detection_filter = None
+        self.filter_pending = False
+
+    # Shows the detections of a file that YOLOv5 is still writing (JSON Lines or an unfinished JSON array)
+    def follow_json(self):
+        json_path, _ = QFileDialog.getOpenFileName(self, "Follow Detections", "", "Detection Files (*.json *.jsonl *.ndjson)")
+        if not json_path:
+            return
+        self.stop_loading()
+        self.stop_following()
+
+        self.raw_detection_table = DetectionTable.empty()
+        self.detections = {}
+        self.set_detection_table(DetectionTable.empty())
+        self.detection_follower = DetectionFollower(json_path, self.frame_count, self.filter_settings, self)
+        self.detection_follower.updated.connect(self.on_follow_updated)
+        self.detection_follower.failed.connect(self.on_follow_failed)
+        self.detection_follower.start()
+        self.statusBar().showMessage(f"Following {basename(json_path)}")
+
+    def stop_following(self):
+        if self.detection_follower is not None:
+            self.detection_follower.requestInterruption()
+            self.detection_follower.wait()
+            self.detection_follower = None
+            self.statusBar().clearMessage()
+
+    def on_follow_updated(self, raw_table, table, first_frame):
+        if self.sender() is not self.detection_follower:
+            return
+        self.raw_detection_table = raw_table
+        self.update_detection_table(table, first_frame)
+        self.statusBar().showMessage(f"Following {basename(self.detection_follower.filename)}: "
+                                     f"{len(raw_table)} detections, {len(table)} after filtering")
+
+    def on_follow_failed(self, message):
+        if self.sender() is self.detection_follower:
+            self.detection_follower = None
+            self.statusBar().showMessage(f"Stopped following: {message}", 5000)
+
+    def on_detections_progress(self, percent):
+        self.statusBar().showMessage(f"Loading detections... {percent}%")
+
+    # Merges a batch of parsed detections so the timeline can draw while parsing continues
+    def on_detections_partial(self, batch):
+        if self.sender() is not self.detection_loader:
+            return
+        new_component = False
+        for component, frames in batch.items():
+            new_component |= component not in self.detections
+            self.detections[component].update(frames)
+        if new_component:
+            self.update_color_legend()
+        self.visual_timeline.set_detections(self.detections)
+
+    def on_detections_loaded(self, raw_table, table):
+        loader = self.sender()
+        if loader is not self.detection_loader:
+            return  # finished just as it was replaced by a newer load
+        self.raw_detection_table = raw_table
+        self.set_detection_table(table)
+        if (loader.frame_count, loader.filter_settings) != (self.frame_count, self.filter_settings):
+            self.apply_filter()  # video or filter settings changed while parsing
+        self.statusBar().showMessage("Detections loaded", 3000)
+
+    def on_detections_failed(self, message):
+        if self.sender() is self.detection_loader:
+            self.detection_loader = None
+            self.statusBar().showMessage(f"Could not load detections: {message}", 5000)
+
+    # detections and segment_index are computed from the table when they are not given
+    def set_detection_table(self, table, detections=None, segment_index=None):
+        self.detection_table = table
+        self.detections = table.components() if detections is None else detections  # {component: sorted unique frames}
+        self.visual_timeline.set_detections(self.detections)  # Update the detections in timeline
+        self.visual_timeline.set_stats(self.raw_detection_table.stats)
+        self.detection_overlay.set_table(table)
+        self.segment_index = SegmentIndex(table) if segment_index is None else segment_index
+        if self.segments_dialog is not None:
+            self.segments_dialog.set_segments(self.segment_index, self.video_index)
+        self.update_color_legend()
+
+    # set_detection_table for a table that only changed from first_frame on
+    def update_detection_table(self, table, first_frame):
+        self.detection_table = table
+        detections = {}
+        for label, count in enumerate(table.label_counts()):
+            if count:
+                frames = table.frames_for_label(label, first_frame)
+                old_frames = self.detections.get(label_map[label], frames[:0])
+                detections[label_map[label]] = np.concatenate((old_frames[:np.searchsorted(old_frames, first_frame)],
+                                                               unique_sorted(frames)))
+        new_components = detections.keys() != self.detections.keys()
+        self.detections = detections
+        self.visual_timeline.update_detections(detections, first_frame)
+        self.visual_timeline.set_stats(self.raw_detection_table.stats)
+        self.detection_overlay.set_table(table)
+        self.segment_index = SegmentIndex(table, previous=self.segment_index, first_frame=first_frame)
+        if self.segments_dialog is not None and self.segments_dialog.isVisible():
+            self.segments_dialog.set_segments(self.segment_index, self.video_index)
+        if new_components:
+            self.update_color_legend()
+
+    # Component chosen for segment navigation, None for all components
+    def segment_component(self):
+        index = self.segment_component_combobox.currentIndex()
+        return self.component_names[index - 1] if index > 0 else None
+
+    def jump_to_next_segment(self):
+        segment = self.segment_index.next_segment(self.current_frame, self.segment_component())
+        if segment is not None:
+            self.timeline.setValue(segment[0])
+
+    def jump_to_previous_segment(self):
+        segment = self.segment_index.previous_segment(self.current_frame, self.segment_component())
+        if segment is not None:
+            self.timeline.setValue(segment[0])
+
+    def show_segments(self):
+        if self.segments_dialog is None:
+            self.segments_dialog = SegmentsDialog(self)
+            self.segments_dialog.jump_requested.connect(self.timeline.setValue)
+            self.segments_dialog.export_requested.connect(self.export_segments)
+        self.segments_dialog.set_segments(self.segment_index, self.video_index)
+        self.segments_dialog.show()
+        self.segments_dialog.raise_()
+
+    # Exports the given segments, or the segments of the components chosen in the dialog
+    def export_segments(self, segments=None):
+        if not self.video_path or self.segment_exporter is not None:
+            return
+        raw_video_path = self.video_path.replace(".mp4", "_Raw.mp4")
+        has_raw_video = raw_video_path != self.video_path and isfile(raw_video_path)
+        dialog = ExportDialog(self.segment_index, segments, has_raw_video, self)
+        if dialog.exec_() != QDialog.Accepted or not dialog.selected_segments():
+            return
+        output_dir = QFileDialog.getExistingDirectory(self, "Export To")
+        if not output_dir:
+            return
+
+        video_path, video_index = self.video_path, self.video_index
+        if dialog.raw_box.isChecked():
+            video_path = raw_video_path
+            video_index = cached_video_index(raw_video_path) or video_index  # scanned when the raw frames are first shown
+        colors = {component: (color.blue(), color.green(), color.red())
+                  for component, color in self.visual_timeline.component_colors.items()}
+        self.segment_exporter = SegmentExporter(video_path, video_index, self.detection_table, dialog.selected_segments(),
+                                                output_dir, dialog.export_settings(), colors, self)
+
+        self.export_progress = QProgressDialog("Exporting segments...", "Cancel", 0, 100, self)
+        self.export_progress.setWindowModality(Qt.WindowModal)
+        self.export_progress.canceled.connect(self.segment_exporter.requestInterruption)
+        self.segment_exporter.progress.connect(self.on_export_progress)
+        self.segment_exporter.exported.connect(self.on_exported)
+        self.segment_exporter.start(QThread.LowPriority)
+
+    def on_export_progress(self, done, total):
+        self.export_progress.setMaximum(total)
+        self.export_progress.setValue(done)
+
+    def on_exported(self, result):
+        self.segment_exporter = None
+        self.export_progress.reset()
+        if isinstance(result, str):
+            self.statusBar().showMessage(f"Export failed: {result}", 5000)
+        else:
+            self.statusBar().showMessage(f"Exported {len(result)} files", 5000)
+
+    # Re-runs the sparse filter on the loaded detections, no need to read the file again
+    def apply_filter(self):
+        if self.detection_follower is not None:
+            self.detection_follower.set_filter(self.frame_count, self.filter_settings)  # applied on its next poll
+        elif self.detection_filter is not None:
+            self.filter_pending = True
+        elif len(self.raw_detection_table):  # empty while a file is still loading
+            self.detection_filter = DetectionFilter(self.raw_detection_table, self.frame_count, self.filter_settings, self)
+            self.detection_filter.filtered.connect(self.on_detections_filtered)
+            self.detection_filter.start()
+
+    def on_detections_filtered(self, table, detections, segment_index):
+        if self.sender() is not self.detection_filter:
+            return
+        self.detection_filter.wait()  # it only has to return from run()
+        self.detection_filter = None
+        if self.filter_pending:
+            # the settings changed while it ran, this result is already out of date
+            self.filter_pending = False
+            self.apply_filter()
+            return
+        self.set_detection_table(table, detections, segment_index)
+
+    def show_filter_settings(self):
+        if self.filter_dialog is None:
+            self.filter_dialog = FilterSettingsDialog(self.filter_settings, self)
+            self.filter_dialog.settings_changed.connect(self.set_filter_settings)
+        self.filter_dialog.show()
+        self.filter_dialog.raise_()
+
+    def set_filter_settings(self, settings):
+        self.filter_settings = settings
+        self.apply_filter()
+
+    def set_stats_metric(self, metric):
+        self.visual_timeline.set_stats_metric(metric)
+        self.update_color_legend()
+
+    # Deletes the previous legend and creates labels for the components in the detections
+    def update_color_legend(self):
+        for label in self.visual_timeline.color_legend_labels:
+            label.deleteLater()
+        self.visual_timeline.color_legend_labels.clear()
+
+        for component in self.component_names:
+            if component in self.detections:  # Check if the component is in the JSON file
+                label = QLabel(component)
+                self.visual_timeline.color_legend_layout.addWidget(label)
+                self.visual_timeline.color_legend_labels.append(label)
+        if self.visual_timeline.stats_metric is not None:
+            label = QLabel(self.visual_timeline.stats_metric)
+            self.visual_timeline.color_legend_layout.addWidget(label)
+            self.visual_timeline.color_legend_labels.append(label)
+        self.visual_timeline.update()
 
 
 if __name__ == '__main__':
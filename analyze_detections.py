@@ -0,0 +1,155 @@
+# Headless batch analyzer for YOLOv5 detection files: runs the same loading and sparse-detection
+# filtering as the viewer, without Qt or VLC, and writes per-component segment summaries.
+#
+#   python analyze_detections.py /data/nightly/*.json --output-dir summaries --workers 8
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from detections import (FilterSettings, SEGMENT_GAP, label_map, load_table, filter_mask, find_segments,
+                        load_cache, save_cache, print_filter_summary, detected_frame_count)
+
+summary_fields = ['file', 'component', 'start', 'end', 'removed', 'segments']
+segment_fields = ['component', 'start_frame', 'end_frame', 'frames', 'detections']
+
+
+# Loads and filters one detection file and collects its per-component counts and segments
+def analyze_file(json_path, frame_count=None, settings=FilterSettings(), max_gap=SEGMENT_GAP, use_cache=True, verbose=False):
+    # Without a video the filter windows run up to the last detected frame
+    frame_count = frame_count or None
+    cached = load_cache(json_path, frame_count, settings) if use_cache else None
+    table, keep = cached if cached is not None else (load_table(json_path), None)
+    if frame_count is None:
+        frame_count = detected_frame_count(table)
+    if keep is None:
+        keep = filter_mask(table, frame_count, settings)
+        if use_cache:
+            save_cache(json_path, table, keep, frame_count, settings)
+    filtered = table.subset(keep)
+    if verbose:
+        print_filter_summary(table, filtered)
+
+    result = {'file': json_path, 'frame_count': frame_count, 'components': []}
+    for label, (initial_count, final_count) in enumerate(zip(table.label_counts(), filtered.label_counts())):
+        if not initial_count:
+            continue
+        frames = filtered.frames_for_label(label)
+        segments = find_segments(frames, max_gap)
+        # detections per segment from the sorted frame array
+        detections = np.searchsorted(frames, segments[:, 1], side='right') - np.searchsorted(frames, segments[:, 0])
+        result['components'].append({
+            'component': label_map[label],
+            'start': int(initial_count),
+            'end': int(final_count),
+            'removed': int(initial_count - final_count),
+            'segments': [{'start_frame': int(start), 'end_frame': int(end), 'frames': int(end - start + 1),
+                          'detections': int(count)} for (start, end), count in zip(segments, detections)],
+        })
+    return result
+
+
+# Output names of the detection files: their paths relative to the folder they all share, so files of the
+# same name from different nights (n1/det.json, n2/det.json) are written to matching subfolders
+def output_stems(files):
+    paths = [os.path.abspath(path) for path in files]
+    try:
+        root = os.path.commonpath([os.path.dirname(path) for path in paths])
+    except ValueError:  # Windows paths on different drives
+        return [os.path.splitext(path.replace(':', '').lstrip('\\/'))[0] for path in paths]
+    return [os.path.splitext(os.path.relpath(path, root))[0] for path in paths]
+
+
+def write_result(result, output_dir, output_format, stem):
+    path = os.path.join(output_dir, f'{stem}_segments.{output_format}')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if output_format == 'json':
+        with open(path, 'w') as f:
+            json.dump(result, f, indent=2)
+        return
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=segment_fields)
+        writer.writeheader()
+        for component in result['components']:
+            for segment in component['segments']:
+                writer.writerow({'component': component['component'], **segment})
+
+
+def write_summary(results, output_dir, output_format):
+    rows = [{'file': result['file'], 'component': component['component'], 'start': component['start'],
+             'end': component['end'], 'removed': component['removed'], 'segments': len(component['segments'])}
+            for result in results for component in result['components']]
+    if output_format == 'json':
+        with open(os.path.join(output_dir, 'summary.json'), 'w') as f:
+            json.dump(rows, f, indent=2)
+        return
+    with open(os.path.join(output_dir, 'summary.csv'), 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=summary_fields)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+# Expands folders and glob patterns into the list of JSON files to analyze
+def find_json_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, '*.json'))))
+        else:
+            files.extend(sorted(glob.glob(path)) or [path])
+    return files
+
+
+def parse_args(argv=None):
+    defaults = FilterSettings()
+    parser = argparse.ArgumentParser(description="Summarize YOLOv5 detection files without the viewer.")
+    parser.add_argument('paths', nargs='+', help="detection JSON files, folders or glob patterns")
+    parser.add_argument('-o', '--output-dir', default='.', help="where the summaries are written (default: .)")
+    parser.add_argument('-f', '--format', choices=['csv', 'json'], default='csv', help="output format (default: csv)")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument('--frame-count', type=int, default=None,
+                        help="frames in the videos; by default the filter runs up to the last detected frame")
+    parser.add_argument('--window', type=int, default=defaults.window, help="filter window in frames")
+    parser.add_argument('--stride', type=int, default=defaults.stride, help="filter window stride in frames")
+    parser.add_argument('--min-hits', type=int, default=defaults.min_hits, help="min. detections per window")
+    parser.add_argument('--min-total', type=int, default=defaults.min_total, help="min. detections per component")
+    parser.add_argument('--max-gap', type=int, default=SEGMENT_GAP, help="max. frames between detections of one segment")
+    parser.add_argument('--no-cache', action='store_true', help="do not read or write the .cache.npz sidecar files")
+    parser.add_argument('-v', '--verbose', action='store_true', help="print the Start/End/Removed counts per file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    settings = FilterSettings(args.window, args.stride, args.min_hits, args.min_total)
+    files = find_json_files(args.paths)
+    if not files:
+        print("No detection files found", file=sys.stderr)
+        return 1
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(analyze_file, path, args.frame_count, settings, args.max_gap, not args.no_cache, args.verbose)
+                   for path in files]
+        results = []
+        for path, stem, future in zip(files, output_stems(files), futures):
+            try:
+                result = future.result()
+            except (OSError, ValueError) as e:  # unreadable file or malformed records
+                print(f"{path}: {e}", file=sys.stderr)
+                continue
+            write_result(result, args.output_dir, args.format, stem)
+            results.append(result)
+
+    write_summary(results, args.output_dir, args.format)
+    print(f"Analyzed {len(results)} of {len(files)} files, summaries in {args.output_dir}")
+    return 0 if len(results) == len(files) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,197 @@
+# Benchmarks of the viewer's hot paths on synthetic inputs: JSON load, filtering, the detection
+# cache, timeline rendering at several zoom levels, update_video ticks and raw-frame grabs. The
+# numbers come from the same profiler timers as View > Performance Overlay.
+#
+#   python benchmarks/bench_hot_paths.py --sizes 10000 100000 1000000 --output results.json
+#   python benchmarks/bench_hot_paths.py --sizes 10000000 --video-minutes 120
+#   python benchmarks/bench_hot_paths.py --baseline results.json   # exit code 1 on a regression
+#
+# Synthetic files are written once to --work-dir and reused. Runs headless on the offscreen Qt
+# platform when there is no display.
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+gui_path = os.path.join(repo_dir, 'GUI_VLC_1.1.py')
+sys.path.insert(0, repo_dir)
+
+from benchmarks.synthetic import detection_file, video_file  # noqa: E402
+from detections import cache_path, load_table, filter_mask, save_cache, load_cache  # noqa: E402
+from profiling import profiler  # noqa: E402
+from video_index import VideoIndex, load_video_index  # noqa: E402
+
+fps = 25
+
+
+def load_gui():
+    if not os.environ.get('DISPLAY') and not os.environ.get('WAYLAND_DISPLAY') and sys.platform.startswith('linux'):
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    spec = importlib.util.spec_from_file_location('gui_vlc', gui_path)
+    gui = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(gui)
+    return gui
+
+
+# Runs the workload with fresh timers and returns their summaries
+def measure(workload):
+    profiler.reset()
+    workload()
+    return profiler.snapshot()['timers']
+
+
+def bench_detections(path, frame_count, repeats):
+    if os.path.exists(cache_path(path)):
+        os.remove(cache_path(path))
+    loaded = []
+    results = measure(lambda: loaded.append(load_table(path)))
+    table = loaded[0]
+    keep = filter_mask(table, frame_count)
+    results.update(measure(lambda: [filter_mask(table, frame_count) for _ in range(repeats)]))
+    results.update(measure(lambda: save_cache(path, table, keep, frame_count)))
+    results.update(measure(lambda: [load_cache(path, frame_count) for _ in range(repeats)]))
+    return table, table.subset(keep), results
+
+
+def bench_timeline(gui, app, table, frame_count, repeats):
+    host = gui.QWidget()
+    timeline = gui.DetectionsTimeline(host)
+    timeline.setAttribute(gui.Qt.WA_PaintOnScreen, False)  # not supported by the offscreen platform
+    host.resize(1600, 400)
+    timeline.resize(1600, 400)
+    host.show()
+    timeline.set_frame_count(frame_count)
+    timeline.set_detections(table.components())
+    app.processEvents()
+
+    results = {}
+    for zoom, span in [('whole video', frame_count + 1), ('1/100', frame_count / 100), ('1000 frames', 1000),
+                       ('20 frames', 20)]:
+        timeline.set_view(frame_count / 3, span)
+
+        def redraw():
+            for _ in range(repeats):
+                timeline.timeline_image = None
+                timeline.repaint()
+
+        results[f'redraw, {zoom}'] = measure(redraw)
+
+    # Playhead moves only repaint two columns of the cached image
+    def playhead():
+        for frame in range(repeats):
+            timeline.set_current_frame(int(frame_count / 3) + frame)
+            app.processEvents()
+
+    results['playhead'] = measure(playhead)
+    host.close()
+    return results
+
+
+def bench_update_video(gui, app, table, frame_count, repeats):
+    gui.VideoPlayerWindow.start_vlc = lambda self: None  # no libvlc needed, update_video skips the player
+    window = gui.VideoPlayerWindow()
+    window.video_index = VideoIndex.constant_rate(fps, frame_count * 1000 / fps)
+    window.frame_count = frame_count
+    window.visual_timeline.set_frame_count(frame_count)
+    window.set_detection_table(table)
+    window.visual_timeline.setAttribute(gui.Qt.WA_PaintOnScreen, False)
+    app.processEvents()
+
+    def ticks():
+        for tick in range(repeats):
+            window.video_time = tick * 40 * 3  # 3x playback speed
+            window.update_video()
+            app.processEvents()
+
+    results = measure(ticks)
+    window.close()
+    return results
+
+
+def bench_raw_frames(video_path, repeats):
+    from frame_server import RawFrameServer
+    server = RawFrameServer(video_path, load_video_index(video_path))
+    rng = np.random.default_rng(0)
+    results = {}
+    try:
+        results['sequential'] = measure(lambda: [server.get_frame(frame) for frame in range(1000, 1000 + repeats)])
+        results['cached'] = measure(lambda: [server.get_frame(frame) for frame in range(1000, 1000 + repeats)])
+        targets = rng.integers(0, server.frame_count, repeats)
+        results['random'] = measure(lambda: [server.get_frame(int(frame)) for frame in targets])
+    finally:
+        server.close()
+    return results
+
+
+def print_results(results):
+    for case, timers in results.items():
+        print(case)
+        for name, stats in timers.items():
+            print(f"    {name:24s}{stats['count']:6d} x   p50 {stats['p50_ms']:9.2f} ms   "
+                  f"p95 {stats['p95_ms']:9.2f} ms   max {stats['max_ms']:9.2f} ms")
+
+
+# Cases whose median got slower than tolerance times the baseline
+def regressions(results, baseline, tolerance):
+    slower = []
+    for case, timers in results.items():
+        for name, stats in timers.items():
+            old = baseline.get(case, {}).get(name)
+            if old and old['p50_ms'] > 0.05 and stats['p50_ms'] > old['p50_ms'] * tolerance:
+                slower.append(f"{case} / {name}: {old['p50_ms']:.2f} ms -> {stats['p50_ms']:.2f} ms")
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the viewer's hot paths on synthetic data.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000],
+                        help="detections per synthetic file (default: 10k 100k 1M; 10M takes a few minutes)")
+    parser.add_argument('--dive-hours', type=float, default=3.0, help="length of the synthetic dives (default: 3)")
+    parser.add_argument('--video-minutes', type=float, default=10.0, help="length of the synthetic video (default: 10)")
+    parser.add_argument('--repeats', type=int, default=50, help="repetitions of the short operations (default: 50)")
+    parser.add_argument('--work-dir', default=os.path.join(tempfile.gettempdir(), 'viewer_benchmarks'),
+                        help="where the synthetic files are kept between runs")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--baseline', help="compare with the results of an earlier run")
+    parser.add_argument('--tolerance', type=float, default=1.25, help="allowed slow-down against the baseline")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.work_dir, exist_ok=True)
+    gui = load_gui()
+    app = gui.QApplication.instance() or gui.QApplication([])
+    profiler.enabled = True
+
+    results = {}
+    frame_count = int(args.dive_hours * 3600 * fps)
+    for size in args.sizes:
+        path = detection_file(args.work_dir, size, frame_count)
+        table, filtered, detections_results = bench_detections(path, frame_count, args.repeats)
+        results[f'detections {size}'] = detections_results
+        for case, timers in bench_timeline(gui, app, filtered, frame_count, args.repeats).items():
+            results[f'timeline {size}, {case}'] = timers
+        results[f'update_video {size}'] = bench_update_video(gui, app, filtered, frame_count, args.repeats)
+
+    video_path = video_file(args.work_dir, int(args.video_minutes * 60 * fps), fps)
+    for case, timers in bench_raw_frames(video_path, args.repeats).items():
+        results[f'raw frames, {case}'] = timers
+
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            slower = regressions(results, json.load(f), args.tolerance)
+        for line in slower:
+            print(f"REGRESSION {line}")
+        return 1 if slower else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+# Startup benchmark for the viewer: import time of the GUI module and time until the first window
+# is painted, each measured in a fresh interpreter so module caches do not hide a slow cold start.
+#
+#   python benchmarks/bench_startup.py --runs 10
+#
+# Runs headless on the offscreen Qt platform when there is no display.
+import argparse
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+gui_path = os.path.join(repo_dir, 'GUI_VLC_1.1.py')
+
+
+# Runs in the child process: imports the GUI module, opens the window and reports the timings
+def measure_once():
+    start = time.perf_counter()
+    sys.path.insert(0, repo_dir)
+    spec = importlib.util.spec_from_file_location('gui_vlc', gui_path)
+    gui = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(gui)
+    imported = time.perf_counter()
+
+    app = gui.QApplication([])
+    painted = []
+
+    # Stop the clock at the first paint of the window, before the deferred VLC start runs
+    class FirstPaint(gui.QObject):
+        def eventFilter(self, obj, event):
+            if event.type() == gui.QEvent.Paint and not painted:
+                painted.append(time.perf_counter())
+            return False
+
+    first_paint = FirstPaint()
+    app.installEventFilter(first_paint)
+    start_vlc = gui.VideoPlayerWindow.start_vlc
+    gui.VideoPlayerWindow.start_vlc = lambda self: None  # timed separately below
+    window = gui.VideoPlayerWindow()
+    while not painted:
+        app.processEvents()
+    app.removeEventFilter(first_paint)
+
+    # VLC start-up, when libvlc is installed
+    vlc_start = time.perf_counter()
+    try:
+        start_vlc(window)
+        vlc_seconds = time.perf_counter() - vlc_start
+    except (ImportError, OSError, NameError, AttributeError):
+        vlc_seconds = None
+
+    print(json.dumps({'import': imported - start, 'first_window': painted[0] - start, 'vlc_start': vlc_seconds}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the viewer's cold start time.")
+    parser.add_argument('--runs', type=int, default=5, help="fresh processes to measure (default: 5)")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        measure_once()
+        return
+
+    env = dict(os.environ)
+    if not env.get('DISPLAY') and not env.get('WAYLAND_DISPLAY') and sys.platform.startswith('linux'):
+        env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+    results = []
+    for _ in range(args.runs):
+        process_start = time.perf_counter()
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child'], env=env,
+                                capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        result['process'] = time.perf_counter() - process_start
+        results.append(result)
+
+    for key, name in [('import', 'import GUI module'), ('first_window', 'time to first window'),
+                      ('vlc_start', 'VLC instance start'), ('process', 'whole process')]:
+        values = [result[key] for result in results if result[key] is not None]
+        if values:
+            print(f"{name:22s} median {statistics.median(values) * 1000:8.1f} ms   "
+                  f"min {min(values) * 1000:8.1f} ms   max {max(values) * 1000:8.1f} ms")
+        else:
+            print(f"{name:22s} not available")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# Synthetic inputs for the benchmarks: detection files in the YOLOv5 export format and long videos.
+# Both are deterministic for a given size and seed, so runs on different builds can be compared.
+import os
+
+import numpy as np
+
+label_count = 10
+
+
+# Detections come in runs, like a chain passing the camera, plus 10% scattered false positives
+def synthetic_detections(count, frame_count, seed=0):
+    rng = np.random.default_rng(seed)
+    runs = max(count // 500, 1)
+    run_starts = rng.integers(0, frame_count, runs)
+    run_labels = rng.integers(0, label_count, runs)
+    in_run = rng.random(count) < 0.9
+    run = rng.integers(0, runs, count)
+    frames = np.where(in_run, run_starts[run] + rng.integers(0, 1000, count), rng.integers(0, frame_count, count))
+    labels = np.where(in_run, run_labels[run], rng.integers(0, label_count, count))
+    frames = np.minimum(frames, frame_count - 1)
+
+    x_min, y_min = rng.random(count) * 0.8, rng.random(count) * 0.8
+    boxes = np.stack([x_min, y_min, x_min + 0.05 + rng.random(count) * 0.15, y_min + 0.05 + rng.random(count) * 0.15], axis=1)
+    return frames, labels, boxes, rng.random(count)
+
+
+def write_detection_file(path, count, frame_count, seed=0, batch_size=100000):
+    frames, labels, boxes, confidence = synthetic_detections(count, frame_count, seed)
+    order = np.argsort(frames.astype(str), kind='stable')  # the exports are sorted by frame number as text
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as f:
+        f.write('[')
+        for start in range(0, count, batch_size):
+            rows = order[start:start + batch_size]
+            items = [f'{{"frame_number": {frames[i]}, "label": "{labels[i]}", "y_min": {boxes[i, 1]:.6f}, '
+                     f'"x_min": {boxes[i, 0]:.6f}, "y_max": {boxes[i, 3]:.6f}, "x_max": {boxes[i, 2]:.6f}, '
+                     f'"confidence": {confidence[i]:.4f}}}' for i in rows]
+            f.write((', ' if start else '') + ', '.join(items))
+        f.write(']')
+    os.replace(temp_path, path)
+
+
+# Writes a video with a moving gradient and the frame number, so every frame decodes differently
+def write_video(path, frame_count, fps=25, size=(320, 180)):
+    import cv2
+    width, height = size
+    temp_path = path + '.tmp.mp4'
+    writer = cv2.VideoWriter(temp_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    gradient = np.add.outer(np.arange(height), np.arange(width)).astype(np.uint8)
+    for frame in range(frame_count):
+        shift = np.uint8(frame % 256)
+        image = np.dstack([gradient + shift, gradient * 2 - shift, np.full_like(gradient, shift)])
+        cv2.putText(image, str(frame), (10, height - 20), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 255, 255), 2)
+        writer.write(image)
+    writer.release()
+    os.replace(temp_path, path)
+
+
+# Returns the path of the detection file in work_dir, writing it the first time
+def detection_file(work_dir, count, frame_count, seed=0):
+    path = os.path.join(work_dir, f'detections_{count}_{frame_count}_{seed}.json')
+    if not os.path.exists(path):
+        write_detection_file(path, count, frame_count, seed)
+    return path
+
+
+def video_file(work_dir, frame_count, fps=25):
+    path = os.path.join(work_dir, f'video_{frame_count}_{fps}.mp4')
+    if not os.path.exists(path):
+        write_video(path, frame_count, fps)
+    return path
+
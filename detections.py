@@ -0,0 +1,706 @@
+# Loading and filtering of YOLOv5 detection exports.
+# Kept free of Qt/VLC imports so it can be used from worker threads and scripts.
+import codecs
+import json
+import os
+from array import array
+from dataclasses import dataclass, asdict
+
+import numpy as np
+
+from profiling import profiler
+from sidecar import load_sidecar, save_sidecar
+
+label_map = ['Anchor', 'Buoy', 'Chain', 'Fiber thimple', 'H-link', 'Rope', 'Shackle', 'Triplate', 'Wire', 'Wire socket']
+
+CHUNK_SIZE = 1 << 20  # bytes read from disk at a time while streaming
+CACHE_VERSION = 2     # bump when the layout of the cache file changes
+SEGMENT_GAP = 25      # detections at most this many frames apart belong to the same segment
+
+
+# Streams the items of a JSON array one by one without loading the whole file.
+# progress(fraction) is called after every chunk that is read from disk.
+def iter_detections(filename, chunk_size=CHUNK_SIZE, progress=None):
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    total_size = os.path.getsize(filename) or 1
+    bytes_read = 0
+    buffer = ''
+    pos = 0
+    in_array = False
+    eof = False
+
+    with open(filename, 'rb') as f:
+        while True:
+            # skip whitespace and separators between items
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+
+            if pos < len(buffer):
+                char = buffer[pos]
+                if not in_array:
+                    if char != '[':
+                        raise ValueError(f"{filename}: expected a JSON array of detections")
+                    in_array = True
+                    pos += 1
+                    continue
+                if char == ']':
+                    return
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    # the item is cut off at the end of the buffer, read more below
+                    if eof:
+                        raise
+                else:
+                    pos = end
+                    yield item
+                    continue
+            elif eof:
+                if in_array:
+                    raise ValueError(f"{filename}: unexpected end of file")
+                return
+
+            chunk = f.read(chunk_size)
+            bytes_read += len(chunk)
+            eof = not chunk
+            buffer = buffer[pos:] + text_decoder.decode(chunk, final=eof)
+            pos = 0
+            if progress is not None:
+                progress(min(bytes_read / total_size, 1.0))
+
+
+# Distinct values of a sorted array, without the sort np.unique does
+def unique_sorted(values):
+    if not len(values):
+        return values
+    first = np.empty(len(values), dtype=bool)
+    first[0] = True
+    np.not_equal(values[1:], values[:-1], out=first[1:])
+    return values[first]
+
+
+# Columnar detection store: one NumPy array per field, rows sorted by frame number.
+# bbox columns are x_min, y_min, x_max, y_max. confidence is NaN when the export has none.
+class DetectionTable:
+    def __init__(self, frame, label, bbox, confidence, presorted=False, label_rows=None, label_offsets=None,
+                 frame_offsets=None):
+        frame = np.asarray(frame, dtype=np.int32)
+        label = np.asarray(label, dtype=np.uint8)
+        bbox = np.asarray(bbox, dtype=np.float32).reshape(-1, 4)
+        confidence = np.asarray(confidence, dtype=np.float32)
+        if not presorted:
+            order = np.argsort(frame, kind='stable')
+            frame, label, bbox, confidence = frame[order], label[order], bbox[order], confidence[order]
+        self.frame = frame
+        self.label = label
+        self.bbox = bbox
+        self.confidence = confidence
+
+        # Per-label index: the rows of label i (in frame order) are label_rows[label_offsets[i]:label_offsets[i + 1]]
+        if label_rows is None:
+            label_rows = np.argsort(self.label, kind='stable').astype(np.int32)
+        self.label_rows = label_rows
+        if label_offsets is None:
+            counts = np.bincount(self.label, minlength=len(label_map))
+            label_offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        self.label_offsets = label_offsets
+
+        # Per-frame index: the rows of frame f are frame_offsets[f]:frame_offsets[f + 1]
+        if frame_offsets is None:
+            last_frame = int(self.frame[-1]) if len(self.frame) else -1
+            frame_offsets = np.searchsorted(self.frame, np.arange(last_frame + 2))
+        self.frame_offsets = frame_offsets
+        self.stats = None  # DetectionStats, filled by compute_stats() or from the cache
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty(0, np.int32), np.empty(0, np.uint8), np.empty((0, 4), np.float32), np.empty(0, np.float32), presorted=True)
+
+    def __len__(self):
+        return len(self.frame)
+
+    # Rows of one label (label id or component name), in frame order, from first_frame on
+    def rows_for_label(self, label, first_frame=0):
+        if isinstance(label, str):
+            label = label_map.index(label)
+        rows = self.label_rows[self.label_offsets[label]:self.label_offsets[label + 1]]
+        if first_frame > 0:
+            # the rows of a label are increasing row numbers, so one binary search finds the tail
+            rows = rows[np.searchsorted(rows, rows.dtype.type(self.first_row(first_frame))):]
+        return rows
+
+    # Sorted frame numbers of one label, one entry per detection, from first_frame on
+    def frames_for_label(self, label, first_frame=0):
+        return self.frame[self.rows_for_label(label, first_frame)]
+
+    # First row detected at frame_number or later
+    def first_row(self, frame_number):
+        if frame_number <= 0:
+            return 0
+        return int(self.frame_offsets[frame_number]) if frame_number < len(self.frame_offsets) else len(self)
+
+    # Slice of the rows detected in one frame
+    def rows_for_frame(self, frame_number):
+        if frame_number < 0 or frame_number + 1 >= len(self.frame_offsets):
+            return slice(0, 0)
+        return slice(int(self.frame_offsets[frame_number]), int(self.frame_offsets[frame_number + 1]))
+
+    def label_counts(self):
+        return np.diff(self.label_offsets)
+
+    # {component name: unique frame numbers} for every component that has detections
+    def components(self):
+        return {label_map[i]: unique_sorted(self.frames_for_label(i)) for i, count in enumerate(self.label_counts()) if count}
+
+    # New table with only the rows where mask is True. The per-label index is carried over instead of sorted again.
+    def subset(self, mask):
+        new_row = np.cumsum(mask, dtype=np.int64) - 1
+        label_rows = new_row[self.label_rows[mask[self.label_rows]]].astype(np.int32)
+        return DetectionTable(self.frame[mask], self.label[mask], self.bbox[mask], self.confidence[mask], presorted=True,
+                              label_rows=label_rows)
+
+    # New table with the rows start:stop, the indexes are sliced instead of built again
+    def row_range(self, start, stop):
+        if start <= 0 and stop >= len(self):
+            return self
+        label_rows = [rows[np.searchsorted(rows, rows.dtype.type(start)):np.searchsorted(rows, rows.dtype.type(stop))]
+                      for rows in (self.rows_for_label(label) for label in range(len(label_map)))]
+        label_offsets = np.cumsum([0] + [len(rows) for rows in label_rows], dtype=np.int64)
+        last_frame = int(self.frame[stop - 1]) if stop > start else -1
+        frame_offsets = np.clip(self.frame_offsets[:last_frame + 2] - start, 0, stop - start)
+        return DetectionTable(self.frame[start:stop], self.label[start:stop], self.bbox[start:stop], self.confidence[start:stop],
+                              presorted=True, label_rows=(np.concatenate(label_rows) - start).astype(np.int32),
+                              label_offsets=label_offsets, frame_offsets=frame_offsets)
+
+    def compute_stats(self):
+        if self.stats is None:
+            self.stats = DetectionStats.from_table(self)
+        return self.stats
+
+    # True when the rows of other all come at or after the last frame, so extend() keeps the row numbers
+    def appends(self, other):
+        return not len(self) or not len(other) or other.frame[0] >= self.frame[-1]
+
+    # New table with the rows of other added
+    def extend(self, other):
+        if not len(other):
+            return self
+        columns = [np.concatenate((a, b)) for a, b in [(self.frame, other.frame), (self.label, other.label),
+                                                       (self.bbox, other.bbox), (self.confidence, other.confidence)]]
+        if not self.appends(other):
+            table = DetectionTable(*columns)
+        else:
+            # both per-label indexes are already in frame order, the new rows go after the old ones
+            label_rows = np.empty(len(self) + len(other), dtype=np.int32)
+            offsets = self.label_offsets + other.label_offsets
+            for label in range(len(label_map)):
+                old = self.rows_for_label(label)
+                start = offsets[label] + len(old)
+                label_rows[offsets[label]:start] = old
+                label_rows[start:offsets[label + 1]] = other.rows_for_label(label) + len(self)
+            # so are the per-frame offsets: the frames up to the old last frame keep theirs
+            last_frame = int(self.frame[-1]) if len(self) else -1
+            frame_offsets = np.concatenate((self.frame_offsets[:last_frame + 1], other.frame_offsets[last_frame + 1:] + len(self)))
+            table = DetectionTable(*columns, presorted=True, label_rows=label_rows, label_offsets=offsets,
+                                   frame_offsets=frame_offsets)
+        if self.stats is not None and other.stats is not None:
+            table.stats = self.stats.merge(other.stats)
+        return table
+
+
+# Per-frame aggregates of a table for judging chain condition and camera drift, computed in one
+# vectorized pass over its columns: detections per frame and label, the summed bbox areas and centers
+# per frame, and per label the distribution of bbox areas and of bbox centers over the image.
+class DetectionStats:
+    area_bins = np.logspace(-4, 0, 33)  # bbox area as a fraction of the image
+    position_bins = 16                 # cells per image side for the center distribution
+
+    def __init__(self, counts, area_sum, center_sum, area_histogram, position_histogram):
+        self.counts = counts                          # (frames, labels) uint16
+        self.area_sum = area_sum                      # (frames,) float32
+        self.center_sum = center_sum                  # (frames, 2) float32, x and y
+        self.area_histogram = area_histogram          # (labels, len(area_bins) - 1) uint32
+        self.position_histogram = position_histogram  # (labels, position_bins, position_bins) uint32, [label, y, x]
+
+    @classmethod
+    def from_table(cls, table):
+        labels = len(label_map)
+        frame_count = int(table.frame[-1]) + 1 if len(table) else 0
+        frame = table.frame.astype(np.int64)
+        boxes = table.bbox.astype(np.float64)
+        width = np.abs(boxes[:, 2] - boxes[:, 0])
+        height = np.abs(boxes[:, 3] - boxes[:, 1])
+        area = width * height
+        center_x = (boxes[:, 0] + boxes[:, 2]) / 2
+        center_y = (boxes[:, 1] + boxes[:, 3]) / 2
+
+        counts = np.bincount(frame * labels + table.label, minlength=frame_count * labels).reshape(frame_count, labels)
+        area_sum = np.bincount(frame, weights=area, minlength=frame_count)
+        center_sum = np.column_stack((np.bincount(frame, weights=center_x, minlength=frame_count),
+                                      np.bincount(frame, weights=center_y, minlength=frame_count)))
+
+        area_bin = np.clip(np.searchsorted(cls.area_bins, area) - 1, 0, len(cls.area_bins) - 2)
+        area_histogram = np.bincount(table.label * (len(cls.area_bins) - 1) + area_bin,
+                                     minlength=labels * (len(cls.area_bins) - 1)).reshape(labels, -1)
+        cells = cls.position_bins
+        cell_x = np.clip((center_x * cells).astype(np.int64), 0, cells - 1)
+        cell_y = np.clip((center_y * cells).astype(np.int64), 0, cells - 1)
+        position_histogram = np.bincount((table.label * cells + cell_y) * cells + cell_x,
+                                         minlength=labels * cells * cells).reshape(labels, cells, cells)
+        return cls(counts.astype(np.uint16), area_sum.astype(np.float32), center_sum.astype(np.float32),
+                   area_histogram.astype(np.uint32), position_histogram.astype(np.uint32))
+
+    @property
+    def frame_count(self):
+        return len(self.counts)
+
+    # Detections per frame over all labels
+    def totals(self):
+        return self.counts.sum(axis=1, dtype=np.int64)
+
+    # Mean bbox area and center of every frame, NaN where a frame has no detections
+    def mean_area(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.area_sum / self.totals()
+
+    def mean_center(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.center_sum / self.totals()[:, None]
+
+    # Stats of this table with the rows of another table added
+    def merge(self, other):
+        frame_count = max(self.frame_count, other.frame_count)
+        def padded(a, b):
+            total = np.zeros((frame_count,) + a.shape[1:], dtype=a.dtype)
+            total[:len(a)] += a
+            total[:len(b)] += b
+            return total
+        return DetectionStats(padded(self.counts, other.counts), padded(self.area_sum, other.area_sum),
+                              padded(self.center_sum, other.center_sum), self.area_histogram + other.area_histogram,
+                              self.position_histogram + other.position_histogram)
+
+    # The arrays under the names they have in the cache file
+    def arrays(self):
+        return {'stats_counts': self.counts, 'stats_area_sum': self.area_sum, 'stats_center_sum': self.center_sum,
+                'stats_area_histogram': self.area_histogram, 'stats_position_histogram': self.position_histogram}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(arrays['stats_counts'], arrays['stats_area_sum'], arrays['stats_center_sum'],
+                   arrays['stats_area_histogram'], arrays['stats_position_histogram'])
+
+
+# Collects parsed detections into compact typed buffers and turns them into a DetectionTable
+class DetectionTableBuilder:
+    def __init__(self):
+        self.frame = array('i')
+        self.label = array('B')
+        self.bbox = array('f')
+        self.confidence = array('f')
+
+    def __len__(self):
+        return len(self.frame)
+
+    # Raises ValueError for a record with missing or invalid fields, the rows before it are kept
+    def append(self, item):
+        try:
+            label = int(item["label"])
+            if not 0 <= label < len(label_map):
+                raise ValueError(f"unknown label {label}")
+            self.frame.append(item["frame_number"])
+            self.label.append(label)
+            self.bbox.extend((item["x_min"], item["y_min"], item["x_max"], item["y_max"]))
+            self.confidence.append(item.get("confidence", float('nan')))
+        except (KeyError, TypeError, ValueError, OverflowError, AttributeError) as e:
+            # drop what was appended of this record, confidence is the last column written
+            rows = len(self.confidence)
+            del self.frame[rows:], self.label[rows:], self.bbox[4 * rows:]
+            raise ValueError(f"invalid detection record {item!r}: {e!r}") from e
+
+    def build(self):
+        return DetectionTable(np.frombuffer(self.frame, dtype=np.int32),
+                              np.frombuffer(self.label, dtype=np.uint8),
+                              np.frombuffer(self.bbox, dtype=np.float32),
+                              np.frombuffer(self.confidence, dtype=np.float32))
+
+
+@profiler.timed('json load')
+def load_table(filename, progress=None):
+    builder = DetectionTableBuilder()
+    for item in iter_detections(filename, progress=progress):
+        builder.append(item)
+    table = builder.build()
+    table.compute_stats()
+    return table
+
+
+# Follows a detection file that is still being written, as JSON Lines or as a JSON array whose
+# closing bracket is not there yet, and parses only the bytes appended since the last poll.
+class DetectionTail:
+    check_size = 64  # bytes before the offset compared on every read to notice a rewritten file
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.offset = 0  # bytes read so far
+        self.inode = None
+        self.last_bytes = b''  # the check_size bytes before offset
+        self.caught_up = False  # whether the last read reached the end of the file
+        self.buffer = ''  # text after the last complete item
+        self.decoder = json.JSONDecoder()
+        self.text_decoder = codecs.getincrementaldecoder('utf-8')()
+
+    # Returns (items appended since the last call, whether the file was replaced and read from the start).
+    # Reads at most max_bytes, see caught_up for whether there is more.
+    def read_new(self, max_bytes=CHUNK_SIZE):
+        restarted = False
+        with open(self.filename, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            f.seek(self.offset - len(self.last_bytes))
+            if self.inode is not None and (stat.st_ino != self.inode or stat.st_size < self.offset
+                                           or f.read(len(self.last_bytes)) != self.last_bytes):
+                # replaced, truncated or rewritten from scratch
+                self.offset, self.last_bytes, self.buffer = 0, b'', ''
+                self.text_decoder.reset()
+                restarted = True
+                f.seek(0)
+            chunk = f.read(max_bytes)
+        self.inode = stat.st_ino
+        self.offset += len(chunk)
+        self.last_bytes = (self.last_bytes + chunk)[-self.check_size:]
+        self.caught_up = self.offset >= stat.st_size
+        self.buffer += self.text_decoder.decode(chunk)
+
+        items = []
+        pos = 0
+        while True:
+            # skip whitespace, separators and the array brackets between items
+            while pos < len(self.buffer) and self.buffer[pos] in ' \t\r\n,[]':
+                pos += 1
+            if pos == len(self.buffer):
+                break
+            try:
+                item, pos = self.decoder.raw_decode(self.buffer, pos)
+            except json.JSONDecodeError as e:
+                if '\n' in self.buffer[e.pos:].rstrip():
+                    raise ValueError(f"{self.filename}: invalid detection record") from e
+                break  # cut off, the writer has not finished it yet
+            items.append(item)
+        self.buffer = self.buffer[pos:]
+        return items, restarted
+
+
+# Parameters of the sparse-detection filter. A component is dropped when it has min_total
+# detections or fewer; otherwise every window of `window` frames (moved `stride` frames at a time)
+# with fewer than min_hits detections of that component has its detections removed.
+@dataclass(frozen=True)
+class FilterSettings:
+    window: int = 100
+    stride: int = 50
+    min_hits: int = 5
+    min_total: int = 20
+
+    def __post_init__(self):
+        if self.window < 1 or self.stride < 1:
+            raise ValueError("filter window and stride must be at least one frame")
+
+
+# Marks the detections of one component that fall in sparse windows. frames must be sorted.
+# With first_start (a multiple of the stride) only the windows from there on are evaluated,
+# frames must then not contain frames before first_start.
+def sparse_frames(frames, frame_count, settings, first_start=0):
+    if frame_count < settings.window or len(frames) == 0:
+        return np.zeros(len(frames), dtype=bool)
+
+    # windows are [start, start + window) for every start that keeps the window inside the video
+    starts = np.arange(first_start, frame_count - settings.window + 1, settings.stride)
+    first = np.searchsorted(frames, starts)
+    last = np.searchsorted(frames, starts + settings.window)
+    sparse = (last - first) < settings.min_hits
+
+    # a detection is removed when at least one sparse window covers it
+    covered = np.bincount(first[sparse], minlength=len(frames) + 1) - np.bincount(last[sparse], minlength=len(frames) + 1)
+    return np.cumsum(covered[:-1]) > 0
+
+
+# Boolean mask over the table rows that survive the sparse-detection filter
+@profiler.timed('filter')
+def filter_mask(table, frame_count, settings=FilterSettings()):
+    keep = np.ones(len(table), dtype=bool)
+    for label, count in enumerate(table.label_counts()):
+        rows = table.rows_for_label(label)
+        if count <= settings.min_total:
+            keep[rows] = False
+        else:
+            keep[rows[sparse_frames(table.frame[rows], frame_count, settings)]] = False
+    return keep
+
+
+# First window start (a multiple of the stride) whose window reaches frame
+def first_window_reaching(frame, settings):
+    return max(-(-(frame - settings.window + 1) // settings.stride), 0) * settings.stride
+
+
+# Filter mask of a table whose rows from len(keep) on were appended at first_frame or later, given the
+# mask of the old rows. Only the windows that can see the new rows are evaluated again.
+# Returns the mask and the first frame whose detections may have changed state.
+def update_filter_mask(table, keep, frame_count, settings, first_frame):
+    new_keep = np.ones(len(table), dtype=bool)
+    new_keep[:len(keep)] = keep
+    changed_start = first_window_reaching(first_frame, settings)  # windows before it saw no new rows
+    window_start = first_window_reaching(changed_start, settings)
+    # with stride > window the new rows before changed_start are in no window, but they are still new
+    first_changed = min(changed_start, first_frame)
+
+    for label, count in enumerate(table.label_counts()):
+        rows = table.rows_for_label(label)
+        if count <= settings.min_total:
+            new_keep[rows] = False
+            continue
+        if np.searchsorted(rows, len(keep)) <= settings.min_total:
+            # the component was dropped as a whole until now
+            new_keep[rows] = ~sparse_frames(table.frame[rows], frame_count, settings)
+            first_changed = 0
+            continue
+        rows = table.rows_for_label(label, window_start)
+        frames = table.frame[rows]
+        sparse = sparse_frames(frames, frame_count, settings, window_start)
+        changed = frames >= changed_start
+        new_keep[rows[changed]] = ~sparse[changed]
+    return new_keep, first_changed
+
+
+# Filtered table after update_filter_mask: the filtered rows before first_changed kept their state,
+# the rows from first_changed on are taken from table again
+def refilter_tail(filtered, table, keep, first_changed):
+    start = table.first_row(first_changed)
+    return filtered.row_range(0, filtered.first_row(first_changed)).extend(
+        table.row_range(start, len(table)).subset(keep[start:]))
+
+
+# Prints the number of detections the filter removed for each component
+def print_filter_summary(table, filtered):
+    for label, (initial_count, final_count) in enumerate(zip(table.label_counts(), filtered.label_counts())):
+        if initial_count:
+            print(f"Start_{label_map[label]}: {initial_count} | End_{label_map[label]}: {final_count} | Removed: {initial_count - final_count}")
+
+    # Print a line of dashes after the labels
+    print("-------------------------")
+
+
+# Removes sparse detections (false positives) and prints what was removed per component
+def filter_detections(table, frame_count, settings=FilterSettings()):
+    filtered = table.subset(filter_mask(table, frame_count, settings))
+    print_filter_summary(table, filtered)
+    return filtered
+
+
+# Collapses sorted frame numbers into segments: an (n, 2) array of [first, last] frames of each run
+# of detections whose frames are at most max_gap apart. Repeated frames never break a segment.
+def find_segments(frames, max_gap=SEGMENT_GAP):
+    if not len(frames):
+        return np.empty((0, 2), dtype=np.int64)
+    breaks = np.nonzero(np.diff(frames) > max_gap)[0]
+    starts = frames[np.concatenate(([0], breaks + 1))]
+    ends = frames[np.concatenate((breaks, [len(frames) - 1]))]
+    return np.column_stack((starts, ends)).astype(np.int64)
+
+
+# Interval index over the segments of every component. Segments of one component never overlap,
+# so sorted start and end arrays answer all queries with binary searches.
+class SegmentIndex:
+    # With the index of an earlier version of the table whose rows only differ from first_frame on,
+    # e.g. while the detection file is still being written, only those rows are grouped again
+    def __init__(self, table, max_gap=SEGMENT_GAP, previous=None, first_frame=0):
+        self.starts = {}
+        self.ends = {}
+        for label, count in enumerate(table.label_counts()):
+            if not count:
+                continue
+            component = label_map[label]
+            if previous is None or component not in previous.starts or first_frame <= 0:
+                segments = find_segments(table.frames_for_label(label), max_gap)
+            else:
+                # The segments starting before first_frame stay, the last one cut back to the last frame before
+                # first_frame. Only the frames from first_frame on are grouped again and joined to it.
+                segments = find_segments(table.frames_for_label(label, first_frame), max_gap)
+                kept = int(np.searchsorted(previous.starts[component], first_frame))
+                if kept:
+                    rows = table.rows_for_label(label)
+                    before = rows[np.searchsorted(rows, rows.dtype.type(table.first_row(first_frame))) - 1]
+                    head = np.column_stack((previous.starts[component][:kept], previous.ends[component][:kept]))
+                    head[-1, 1] = table.frame[before]
+                    if len(segments) and segments[0, 0] - head[-1, 1] <= max_gap:
+                        head[-1, 1] = segments[0, 1]
+                        segments = segments[1:]
+                    segments = np.concatenate((head, segments))
+            self.starts[component] = segments[:, 0]
+            self.ends[component] = segments[:, 1]
+
+    def components(self):
+        return list(self.starts)
+
+    # [(first frame, last frame)] of a component
+    def segments(self, component):
+        return list(zip(self.starts[component].tolist(), self.ends[component].tolist())) if component in self.starts else []
+
+    # (first, last) of the first segment of the component starting after frame, or None.
+    # component None means any component.
+    def next_segment(self, frame, component=None):
+        found = []
+        for name in ([component] if component is not None else self.starts):
+            if name in self.starts:
+                i = int(np.searchsorted(self.starts[name], frame, side='right'))
+                if i < len(self.starts[name]):
+                    found.append((int(self.starts[name][i]), int(self.ends[name][i])))
+        return min(found) if found else None
+
+    # (first, last) of the last segment of the component starting before frame, or None
+    def previous_segment(self, frame, component=None):
+        found = []
+        for name in ([component] if component is not None else self.starts):
+            if name in self.starts:
+                i = int(np.searchsorted(self.starts[name], frame, side='left')) - 1
+                if i >= 0:
+                    found.append((int(self.starts[name][i]), int(self.ends[name][i])))
+        return max(found) if found else None
+
+    # Components with a segment overlapping the frames first..last
+    def components_in_range(self, first, last):
+        present = []
+        for name, starts in self.starts.items():
+            # the last segment starting at or before `last` is the only one that can reach `first`
+            i = int(np.searchsorted(starts, last, side='right')) - 1
+            if i >= 0 and self.ends[name][i] >= first:
+                present.append(name)
+        return present
+
+
+# Multi-resolution sums of a per-frame value for drawing timelines at any zoom:
+# level k holds the sum of the values in each block of 2**k frames.
+class SumPyramid:
+    def __init__(self, values):
+        level = np.asarray(values)
+        if not len(level):
+            level = np.zeros(1, dtype=level.dtype)
+        self.levels = [level]
+        while len(level) > 1:
+            if len(level) % 2:
+                level = np.append(level, np.zeros(1, dtype=level.dtype))
+            level = level[0::2] + level[1::2]
+            self.levels.append(level)
+
+    def __len__(self):
+        return len(self.levels[0])
+
+    # Sum of the values in each of `columns` pixel columns, where column c covers the frames
+    # first + c * frames_per_column up to first + (c + 1) * frames_per_column. Costs O(columns), not O(frames).
+    def column_sums(self, first, frames_per_column, columns):
+        if frames_per_column < 1:
+            # zoomed in: every column lies inside one frame
+            frame_of_column = np.floor(first + (np.arange(columns) + 0.5) * frames_per_column).astype(np.int64)
+            level = self.levels[0]
+            inside = (frame_of_column >= 0) & (frame_of_column < len(level))
+            sums = np.zeros(columns)
+            sums[inside] = level[frame_of_column[inside]]
+            return sums
+
+        # the coarsest level whose blocks still fit in one column
+        k = min(int(np.log2(frames_per_column)), len(self.levels) - 1)
+        block = 1 << k
+        level = self.levels[k]
+        first_block = max(int(first // block), 0)
+        last_block = min(int(np.ceil((first + columns * frames_per_column) / block)), len(level))
+        if last_block <= first_block:
+            return np.zeros(columns)
+
+        values = level[first_block:last_block]
+        hit = np.nonzero(values)[0]
+        column = ((first_block + hit) * block - first) // frames_per_column
+        inside = (column >= 0) & (column < columns)
+        return np.bincount(column[inside].astype(np.int64), weights=values[hit][inside], minlength=columns)
+
+
+# SumPyramid of one component's detected frames (1 where the component is detected)
+class OccupancyPyramid(SumPyramid):
+    def __init__(self, frames, frame_count=0):
+        frames = np.asarray(frames, dtype=np.int64)
+        frames = frames[frames >= 0]
+        length = max(frame_count, int(frames.max()) + 1 if len(frames) else 0, 1)
+        level = np.zeros(length, dtype=np.uint32)
+        level[frames] = 1
+        super().__init__(level)
+
+    # Replaces the detected frames from `first` on with frames (sorted, all >= first), updating only
+    # the blocks that change. frames must lie inside the pyramid (see fits), nothing is stored past its end.
+    def replace_from(self, first, frames):
+        level = self.levels[0]
+        first = max(int(first), 0)
+        if first >= len(level):
+            return
+        new = np.zeros(len(level) - first, dtype=np.int64)
+        new[np.asarray(frames, dtype=np.int64) - first] = 1
+        changed = np.nonzero(new != level[first:])[0]
+        delta = new[changed] - level[first:][changed]
+        changed += first
+        for k, level in enumerate(self.levels):
+            np.add.at(level, changed >> k, delta.astype(level.dtype))
+
+    # True when replace_from(first, frames) can update the pyramid in place
+    def fits(self, first, frames):
+        return first < len(self) and (not len(frames) or frames[-1] < len(self))
+
+    # Fraction of detected frames in each pixel column
+    def column_density(self, first, frames_per_column, columns):
+        return np.minimum(self.column_sums(first, frames_per_column, columns) / max(frames_per_column, 1), 1.0)
+
+
+# Sidecar cache next to the detection file: the parsed table plus the filter mask of the last
+# filter run, so reopening a file skips parsing and (with the same settings) filtering.
+def cache_path(filename):
+    return filename + '.cache.npz'
+
+
+def filter_key(frame_count, settings):
+    return json.dumps({'frame_count': frame_count, **asdict(settings)})
+
+
+# Frame count for filtering a table without its video: the filter windows run up to the last detected frame
+def detected_frame_count(table):
+    return int(table.frame[-1]) + 1 if len(table) else 0
+
+
+# Returns (table, keep) from the cache, keep is None when it was made with other filter parameters.
+# frame_count None stands for detected_frame_count of the cached table. Returns None when there is no
+# valid cache for the file.
+@profiler.timed('cache load')
+def load_cache(filename, frame_count, settings=FilterSettings()):
+    def read(cache):
+        table = DetectionTable(cache['frame'], cache['label'], cache['bbox'], cache['confidence'],
+                               presorted=True, label_rows=cache['label_rows'])
+        table.stats = DetectionStats.from_arrays(cache)
+        count = detected_frame_count(table) if frame_count is None else frame_count
+        keep = cache['keep'] if str(cache['filter_key']) == filter_key(count, settings) else None
+        return table, keep
+    return load_sidecar(cache_path(filename), filename, read, version=CACHE_VERSION)
+
+
+@profiler.timed('cache save')
+def save_cache(filename, table, keep, frame_count, settings=FilterSettings()):
+    save_sidecar(cache_path(filename), filename,
+                 dict(filter_key=filter_key(frame_count, settings), frame=table.frame, label=table.label,
+                      bbox=table.bbox, confidence=table.confidence, label_rows=table.label_rows, keep=keep,
+                      **table.compute_stats().arrays()),
+                 version=CACHE_VERSION)
+
+
+# Loads a detection file through the cache. Returns the full and the filtered table.
+def load_filtered(filename, frame_count, settings=FilterSettings(), progress=None):
+    cached = load_cache(filename, frame_count, settings)
+    if cached is not None and cached[1] is not None:
+        table, keep = cached
+    else:
+        table = cached[0] if cached is not None else load_table(filename, progress)
+        keep = filter_mask(table, frame_count, settings)
+        save_cache(filename, table, keep, frame_count, settings)
+    return table, table.subset(keep)
@@ -0,0 +1,174 @@
+# Bulk export of detection segments as annotated stills or video clips. Frames stream through
+# decode (one reader thread) -> annotate/encode (thread pool) -> write (calling thread), so at most
+# queue_size + 2 * max_workers frames are in memory however many segments are exported.
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+
+from detections import label_map
+
+default_color = (240, 230, 2)  # BGR
+
+
+@dataclass(frozen=True)
+class ExportSettings:
+    mode: str = 'stills'        # 'stills' (images) or 'clips' (videos)
+    stills_per_segment: int = 5  # spread over the frames of the segment that have a detection
+    padding: int = 0            # frames added before and after every clip
+    annotate: bool = True       # draw the bounding boxes and a caption
+
+    def __post_init__(self):
+        if self.mode not in ('stills', 'clips'):
+            raise ValueError(f"Unknown export mode {self.mode!r}")
+        if self.stills_per_segment < 1:
+            raise ValueError("stills_per_segment must be at least 1")
+
+
+# One output file (clip) or group of files (stills) per segment
+@dataclass
+class ExportJob:
+    component: str
+    first: int
+    last: int
+    frames: np.ndarray  # frames to decode, sorted
+
+
+def export_jobs(table, segments, settings, frame_count):
+    jobs = []
+    for component, first, last in segments:
+        if settings.mode == 'clips':
+            start = max(first - settings.padding, 0)
+            stop = last + settings.padding + 1
+            frames = np.arange(start, min(stop, frame_count) if frame_count else stop)
+        else:
+            detected = np.unique(table.frames_for_label(component))
+            detected = detected[(detected >= first) & (detected <= last)]
+            if len(detected) > settings.stills_per_segment:
+                detected = detected[np.linspace(0, len(detected) - 1, settings.stills_per_segment).round().astype(int)]
+            frames = detected
+        jobs.append(ExportJob(component, int(first), int(last), frames))
+    jobs.sort(key=lambda job: job.first)  # the reader only moves forward through the video
+    return jobs
+
+
+def output_name(video_path, job, frame=None):
+    stem = os.path.splitext(os.path.basename(video_path))[0]
+    component = job.component.replace(' ', '_')
+    if frame is None:
+        return f"{stem}_{component}_{job.first:06d}-{job.last:06d}.mp4"
+    return f"{stem}_{component}_{frame:06d}.jpg"
+
+
+# Draws the boxes of every detection of the frame (bbox in fractions of the image) and a caption
+def annotate(image, table, frame, caption, colors):
+    import cv2
+    height, width = image.shape[:2]
+    rows = table.rows_for_frame(frame)
+    boxes = table.bbox[rows]
+    xs = (np.sort(boxes[:, [0, 2]], axis=1) * width).astype(int)
+    ys = (np.sort(boxes[:, [1, 3]], axis=1) * height).astype(int)
+    for (x0, x1), (y0, y1), label in zip(xs, ys, table.label[rows]):
+        component = label_map[label]
+        color = colors.get(component, default_color)
+        cv2.rectangle(image, (x0, y0), (x1, y1), color, 2)
+        cv2.putText(image, component, (x0 + 2, max(y0 - 4, 12)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1, cv2.LINE_AA)
+    cv2.putText(image, caption, (8, height - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1, cv2.LINE_AA)
+    return image
+
+
+# Writes the segments [(component, first frame, last frame)] of the video to output_dir and returns the
+# written paths. cancelled() is polled between frames; progress(done, total) is called per frame.
+def export_segments(video_path, video_index, table, segments, output_dir, settings=ExportSettings(), colors=None,
+                    max_workers=None, queue_size=16, cancelled=lambda: False, progress=None):
+    import cv2
+    colors = colors or {}
+    max_workers = max_workers or min(os.cpu_count() or 1, 8)
+    jobs = export_jobs(table, segments, settings, video_index.frame_count)
+    total = sum(len(job.frames) for job in jobs)
+    os.makedirs(output_dir, exist_ok=True)
+
+    decoded = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    def decode():
+        from frame_server import RawFrameServer
+        reader = RawFrameServer(video_path, video_index)
+        reader.cache_size = 1  # frames are read once, in order
+        try:
+            for job in jobs:
+                for frame in job.frames:
+                    if cancelled() or stop.is_set():
+                        return
+                    decoded.put((job, int(frame), reader.get_frame(int(frame))))
+        finally:
+            reader.close()
+            decoded.put(None)
+
+    def render(job, frame, image):
+        if settings.annotate:
+            caption = f"{job.component}  frame {frame}  {video_index.frame_to_ms(frame) / 1000:.2f} s"
+            image = annotate(image.copy(), table, frame, caption, colors)
+        if settings.mode == 'stills':
+            path = os.path.join(output_dir, output_name(video_path, job, frame))
+            if not cv2.imwrite(path, image):
+                raise OSError(f"Could not write {path}")
+            return path
+        return image
+
+    written = []
+    writer, writer_job = None, None
+    done = 0
+    reader_thread = threading.Thread(target=decode, daemon=True)
+    reader_thread.start()
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            pending = deque()  # futures in frame order, the clips need their frames in sequence
+
+            def finish(job, future):
+                nonlocal writer, writer_job, done
+                result = future.result()
+                if settings.mode == 'stills':
+                    written.append(result)
+                else:
+                    if job is not writer_job:
+                        if writer is not None:
+                            writer.release()
+                        path = os.path.join(output_dir, output_name(video_path, job))
+                        height, width = result.shape[:2]
+                        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), video_index.fps, (width, height))
+                        writer_job = job
+                        written.append(path)
+                    writer.write(result)
+                done += 1
+                if progress is not None:
+                    progress(done, total)
+
+            while True:
+                item = decoded.get()
+                if item is None:
+                    break
+                job, frame, image = item
+                if image is None:  # past the end of the video
+                    done += 1
+                    continue
+                pending.append((job, pool.submit(render, job, frame, image)))
+                while pending and (len(pending) >= 2 * max_workers or pending[0][1].done()):
+                    finish(*pending.popleft())
+            while pending:
+                finish(*pending.popleft())
+    finally:
+        # Unblock and stop the reader when writing failed
+        stop.set()
+        while reader_thread.is_alive():
+            try:
+                decoded.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        if writer is not None:
+            writer.release()
+    return written
@@ -0,0 +1,125 @@
+# Long-lived frame server for the raw (unfiltered) video.
+# Keeps one cv2.VideoCapture open, caches decoded frames and prefetches neighbours in the background.
+import threading
+from collections import OrderedDict
+
+import cv2
+
+from profiling import profiler
+
+
+class RawFrameServer:
+    cache_size = 96     # decoded frames kept in memory
+    prefetch_ahead = 24
+    prefetch_behind = 8
+    max_skip = 48       # without known keyframes, reading forward this many frames is assumed cheaper than seeking
+
+    def __init__(self, video_path, video_index=None):
+        self.video_path = video_path
+        self.video_index = video_index  # VideoIndex of the raw video, when it could be built
+        self.capture = cv2.VideoCapture(video_path)
+        if video_index is not None:
+            self.frame_count = video_index.frame_count
+        else:
+            self.frame_count = int(self.capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.next_frame = 0  # frame the capture decodes on the next read()
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+        # Prefetch requests go to one background thread, a newer request cancels the older one
+        self.prefetch_target = None
+        self.prefetch_generation = 0
+        self.prefetch_condition = threading.Condition()
+        self.closed = False
+        self.prefetch_thread = threading.Thread(target=self.prefetch_loop, daemon=True)
+        self.prefetch_thread.start()
+
+    def is_opened(self):
+        return self.capture.isOpened()
+
+    # Switches to the index of a background scan that finished after the server was opened
+    def set_video_index(self, video_index):
+        with self.lock:
+            self.video_index = video_index
+            self.frame_count = video_index.frame_count
+
+    # Returns the decoded BGR frame, or None when it can not be read
+    @profiler.timed('raw frame grab')
+    def get_frame(self, frame_index):
+        with self.lock:
+            return self.read_frame(frame_index)
+
+    # Must be called with self.lock held
+    def read_frame(self, frame_index):
+        if frame_index in self.cache:
+            self.cache.move_to_end(frame_index)
+            profiler.count('raw frame cache hits')
+            return self.cache[frame_index]
+        profiler.count('raw frame decodes')
+        if self.closed or frame_index < 0 or (self.frame_count and frame_index >= self.frame_count):
+            return None
+
+        skip = frame_index - self.next_frame
+        if self.video_index is not None and self.video_index.keyframes_known:
+            # Reading forward is always cheaper than seeking while no keyframe lies in between
+            seek = skip < 0 or self.video_index.keyframe_before(frame_index) > self.next_frame
+        else:
+            seek = skip < 0 or skip > self.max_skip
+        if seek:
+            # CAP_PROP_POS_FRAMES decodes from the previous keyframe, so it is only used for real jumps
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+        else:
+            for _ in range(skip):
+                self.capture.grab()
+
+        ret, frame = self.capture.read()
+        self.next_frame = frame_index + 1
+        if not ret:
+            return None
+
+        self.cache[frame_index] = frame
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return frame
+
+    # Decodes the frames around frame_index in the background (e.g. while the video is paused)
+    def prefetch_around(self, frame_index):
+        with self.prefetch_condition:
+            self.prefetch_target = frame_index
+            self.prefetch_generation += 1
+            self.prefetch_condition.notify()
+
+    def cancel_prefetch(self):
+        with self.prefetch_condition:
+            self.prefetch_target = None
+            self.prefetch_generation += 1
+
+    def prefetch_loop(self):
+        while True:
+            with self.prefetch_condition:
+                while self.prefetch_target is None and not self.closed:
+                    self.prefetch_condition.wait()
+                if self.closed:
+                    return
+                target, generation = self.prefetch_target, self.prefetch_generation
+                self.prefetch_target = None
+
+            # Frames behind first so the forward frames continue from the same decoder position
+            start = max(target - self.prefetch_behind, 0)
+            order = list(range(start, target)) + list(range(target + 1, target + self.prefetch_ahead + 1))
+            for frame_index in order:
+                if generation != self.prefetch_generation or self.closed:
+                    break  # superseded by a newer request
+                # Take the lock per frame so a click from the UI never waits for the whole batch
+                with self.lock:
+                    if frame_index not in self.cache and self.read_frame(frame_index) is None:
+                        break
+
+    def close(self):
+        with self.prefetch_condition:
+            self.closed = True
+            self.prefetch_condition.notify()
+        self.prefetch_thread.join()
+        with self.lock:
+            self.capture.release()
+            self.cache.clear()
@@ -0,0 +1,104 @@
+# Lightweight timers and counters for the viewer's hot paths (JSON load, filtering, painting,
+# playback ticks, raw-frame grabs). Disabled it costs one attribute check per call; enable it with
+# the VIEWER_PROFILE environment variable or from View > Performance Overlay. VIEWER_PROFILE=stats.json
+# also writes the numbers to that file when the viewer closes.
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+import numpy as np
+
+
+class TimerStats:
+    recent_size = 256  # latest samples kept for the percentiles
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=self.recent_size)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.recent.append(seconds)
+
+    def summary(self):
+        recent = np.asarray(self.recent)
+        p50, p95 = np.percentile(recent, [50, 95]) if len(recent) else (0.0, 0.0)
+        return {'count': self.count, 'total_ms': self.total * 1000, 'mean_ms': self.total / max(self.count, 1) * 1000,
+                'p50_ms': p50 * 1000, 'p95_ms': p95 * 1000, 'max_ms': self.max * 1000}
+
+
+class Profiler:
+    def __init__(self, enabled=False, dump_path=None):
+        self.enabled = enabled
+        self.dump_path = dump_path  # where the viewer writes the snapshot when it closes
+        self.timers = {}    # {name: TimerStats}
+        self.counters = {}  # {name: int}
+        self.lock = threading.Lock()  # frame grabs and loads are timed on worker threads
+
+    @contextmanager
+    def timer(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    # Decorator form of timer
+    def timed(self, name):
+        def decorate(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with self.timer(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def add_time(self, name, seconds):
+        with self.lock:
+            self.timers.setdefault(name, TimerStats()).add(seconds)
+
+    def count(self, name, n=1):
+        if self.enabled:
+            with self.lock:
+                self.counters[name] = self.counters.get(name, 0) + n
+
+    def reset(self):
+        with self.lock:
+            self.timers.clear()
+            self.counters.clear()
+
+    def snapshot(self):
+        with self.lock:
+            return {'timers': {name: stats.summary() for name, stats in sorted(self.timers.items())},
+                    'counters': dict(sorted(self.counters.items()))}
+
+    # Fixed-width table for the overlay and the console
+    def report(self):
+        snapshot = self.snapshot()
+        lines = [f"{'timer':24s}{'count':>8s}{'mean ms':>10s}{'p95 ms':>10s}{'max ms':>10s}"]
+        for name, stats in snapshot['timers'].items():
+            lines.append(f"{name:24s}{stats['count']:8d}{stats['mean_ms']:10.2f}{stats['p95_ms']:10.2f}{stats['max_ms']:10.2f}")
+        for name, value in snapshot['counters'].items():
+            lines.append(f"{name:24s}{value:8d}")
+        return "\n".join(lines)
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+
+profile_setting = os.environ.get('VIEWER_PROFILE', '')
+profiler = Profiler(enabled=bool(profile_setting), dump_path=profile_setting if profile_setting.endswith('.json') else None)
@@ -0,0 +1,122 @@
+# Batch ingestion of a folder with many dives: pairs every video with its detection file and
+# builds the video indexes and detection caches in a process pool, so switching dives afterwards
+# only reads caches.
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from detections import FilterSettings, label_map, load_filtered
+from video_index import load_video_index
+
+video_extensions = (".mp4", ".avi", ".vob", ".mpg")
+raw_suffix = "_Raw"  # unfiltered companion video shown by the "No filter (Image)" viewer
+
+
+# Returns ([(video_path, json_path or None)] sorted by video name, [json_path] that no video was paired with).
+# A video is paired with the JSON file of the same name, else with the longest JSON name its own name starts
+# with (e.g. Dive1.json for Dive1_Raw.mp4). If one video is left without a partner it gets the first JSON left.
+def pair_files(folder_path):
+    videos, jsons = {}, {}
+    for name in sorted(os.listdir(folder_path)):
+        path = os.path.join(folder_path, name)
+        if not os.path.isfile(path):
+            continue
+        stem, extension = os.path.splitext(name)
+        if extension.lower() in video_extensions:
+            videos[stem] = path
+        elif extension.lower() == ".json":
+            jsons[stem] = path
+
+    # Raw videos belong to the video without the suffix, they are only listed when that one is missing
+    for stem in [stem for stem in videos if stem.endswith(raw_suffix) and stem[:-len(raw_suffix)] in videos]:
+        del videos[stem]
+
+    pairs = {}
+    for stem, video_path in videos.items():
+        json_stem = stem if stem in jsons else stem[:-len(raw_suffix)] if stem.endswith(raw_suffix) else None
+        pairs[stem] = (video_path, jsons.pop(json_stem, None))
+
+    for stem, (video_path, json_path) in pairs.items():
+        prefixes = [json_stem for json_stem in jsons if json_path is None and stem.startswith(json_stem)]
+        if prefixes:
+            pairs[stem] = (video_path, jsons.pop(max(prefixes, key=len)))
+
+    unpaired = [stem for stem, (_, json_path) in pairs.items() if json_path is None]
+    if len(unpaired) == 1 and jsons:
+        pairs[unpaired[0]] = (pairs[unpaired[0]][0], jsons.pop(next(iter(jsons))))
+
+    return [pairs[stem] for stem in sorted(pairs)], list(jsons.values())
+
+
+# Builds (or reads) the caches of one dive and returns its summary. Runs in a pool worker.
+# Once cancelled() turns True the video scan stops and the detection file is skipped.
+def summarize_pair(video_path, json_path, settings=FilterSettings(), cancelled=lambda: False):
+    video_index = load_video_index(video_path, cancelled)
+    summary = {
+        'video_path': video_path,
+        'json_path': json_path,
+        'frame_count': video_index.frame_count if video_index is not None else 0,
+        'fps': video_index.fps if video_index is not None else 0.0,
+        'counts': {},  # {component: (detections before filtering, after filtering)}
+        'error': None,  # why the detection file could not be read
+    }
+    if json_path is not None and not cancelled():
+        try:
+            table, filtered = load_filtered(json_path, summary['frame_count'], settings)
+        except (OSError, ValueError) as e:  # unreadable, truncated or malformed file
+            summary['error'] = str(e)
+            return summary
+        for label, (initial_count, final_count) in enumerate(zip(table.label_counts(), filtered.label_counts())):
+            if initial_count:
+                summary['counts'][label_map[label]] = (int(initial_count), int(final_count))
+    return summary
+
+
+# Set in every pool worker, tells it that the session was cancelled
+worker_cancel_event = None
+
+
+def init_worker(cancel_event):
+    global worker_cancel_event
+    worker_cancel_event = cancel_event
+
+
+def summarize_in_worker(video_path, json_path, settings):
+    return summarize_pair(video_path, json_path, settings, worker_cancel_event.is_set)
+
+
+# Summarizes all pairs, in parallel when there is more than one. progress(done, total) is called
+# after every finished dive. Returns the summaries in the order of pairs, or None when cancelled()
+# turned True; the dives that are being summarized then stop at their next check.
+def build_session(pairs, settings=FilterSettings(), max_workers=None, progress=None, cancelled=lambda: False):
+    summaries = [None] * len(pairs)
+    if len(pairs) <= 1 or max_workers == 1:
+        for i, (video_path, json_path) in enumerate(pairs):
+            summaries[i] = summarize_pair(video_path, json_path, settings, cancelled)
+            if cancelled():
+                return None
+            if progress is not None:
+                progress(i + 1, len(pairs))
+        return summaries
+
+    # spawn: the workers must not inherit the GUI's threads. They do import the main script again,
+    # the viewer's Qt imports included.
+    context = multiprocessing.get_context('spawn')
+    cancel_event = context.Event()
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context,
+                             initializer=init_worker, initargs=(cancel_event,)) as pool:
+        futures = {pool.submit(summarize_in_worker, video_path, json_path, settings): i
+                   for i, (video_path, json_path) in enumerate(pairs)}
+        pending = set(futures)
+        while pending:
+            finished, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+            if cancelled():
+                cancel_event.set()
+                for future in pending:
+                    future.cancel()
+                return None
+            for future in finished:
+                summaries[futures[future]] = future.result()
+            if finished and progress is not None:
+                progress(len(futures) - len(pending), len(pairs))
+    return summaries
@@ -0,0 +1,37 @@
+# Cache files kept next to a source file (detection caches, video indexes, thumbnail atlases).
+# Every cache stores the source_key of the file it was built from and is ignored once that file changes.
+import json
+import os
+
+import numpy as np
+
+
+# Identifies one version of a source file; extra fields (cache version, settings) become part of the key
+def source_key(source_path, **extra):
+    stat = os.stat(source_path)
+    return json.dumps({**extra, 'path': os.path.abspath(source_path),
+                       'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns})
+
+
+# Returns read(cache) when the cache at path was built from the current source_path, otherwise None.
+# Missing, stale, truncated and older-format caches all read as None.
+def load_sidecar(path, source_path, read, **extra):
+    try:
+        with np.load(path, allow_pickle=False) as cache:
+            if str(cache['source_key']) == source_key(source_path, **extra):
+                return read(cache)
+    except (OSError, KeyError, ValueError):
+        pass
+    return None
+
+
+# Writes the cache atomically; failures (e.g. a read-only survey drive) only cost the speed-up
+def save_sidecar(path, source_path, arrays, **extra):
+    temp_path = path + '.tmp'
+    try:
+        with open(temp_path, 'wb') as f:
+            np.savez(f, source_key=source_key(source_path, **extra), **arrays)
+        os.replace(temp_path, path)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
@@ -0,0 +1,90 @@
+# Regression tests for following a detection file that is still being written
+import importlib.util
+import os
+import sys
+
+import numpy as np
+import pytest
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+from detections import (DetectionTable, FilterSettings, OccupancyPyramid, filter_mask,  # noqa: E402
+                        refilter_tail, update_filter_mask)
+
+
+@pytest.fixture(scope='module')
+def gui():
+    pytest.importorskip('PyQt5')
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    spec = importlib.util.spec_from_file_location('gui_vlc', os.path.join(repo_dir, 'GUI_VLC_1.1.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.app = module.QApplication.instance() or module.QApplication([])
+    return module
+
+
+def test_replace_from_past_the_end():
+    pyramid = OccupancyPyramid(np.arange(0, 500), 0)
+    pyramid.replace_from(19950, [])
+    assert pyramid.levels[-1][0] == 500
+    assert not pyramid.fits(19950, [])
+
+
+# Chain at 0-500, then Shackle from 10000 and from 20000, with no video loaded (frame count 0)
+def test_lanes_grow_past_the_video(gui):
+    host = gui.QWidget()
+    timeline = gui.DetectionsTimeline(host)
+    timeline.set_frame_count(0)
+    detections = {'Chain': np.arange(0, 501)}
+    timeline.update_detections(detections, 0)
+    detections = {**detections, 'Shackle': np.arange(10000, 10100)}
+    timeline.update_detections(detections, 10000)
+    detections = {**detections, 'Shackle': np.concatenate((np.arange(10000, 10100), np.arange(20000, 20100)))}
+    timeline.update_detections(detections, 19950)
+
+    for component, frames in detections.items():
+        expected = OccupancyPyramid(frames, 1)
+        pyramid = timeline.pyramids[component]
+        assert pyramid.column_sums(0, 64, 400).tolist() == expected.column_sums(0, 64, 400).tolist()
+    host.close()
+
+
+def table_of(frames, labels):
+    return DetectionTable(np.asarray(frames, np.int32), np.asarray(labels, np.uint8),
+                          np.zeros((len(frames), 4), np.float32), np.ones(len(frames), np.float32))
+
+
+# Appends the rows in batches the way DetectionFollower does and returns the filtered frames and labels
+def follow(batches, frame_count, settings):
+    table = DetectionTable.empty()
+    keep = np.ones(0, dtype=bool)
+    filtered = table
+    for frames, labels in batches:
+        new_rows = table_of(frames, labels)
+        table = table.extend(new_rows)
+        keep, first_changed = update_filter_mask(table, keep, frame_count, settings, int(new_rows.frame[0]))
+        filtered = refilter_tail(filtered, table, keep, first_changed)
+    return table, filtered
+
+
+def test_append_between_windows():
+    settings = FilterSettings(window=7, stride=13, min_hits=0, min_total=0)
+    table, filtered = follow([([37], [1]), ([72], [1])], 100, settings)
+    assert filtered.frame.tolist() == [37, 72]
+    assert filtered.frame.tolist() == table.subset(filter_mask(table, 100, settings)).frame.tolist()
+
+
+def test_incremental_filter_matches_full_filter():
+    rng = np.random.default_rng(0)
+    for _ in range(300):
+        settings = FilterSettings(window=int(rng.integers(1, 20)), stride=int(rng.integers(1, 20)),
+                                  min_hits=int(rng.integers(0, 4)), min_total=int(rng.integers(0, 4)))
+        frames = np.sort(rng.integers(0, 200, int(rng.integers(1, 60))))
+        labels = rng.integers(0, 3, len(frames))
+        cuts = np.sort(rng.integers(1, len(frames) + 1, 3))
+        batches = [(frames[a:b], labels[a:b]) for a, b in zip(np.r_[0, cuts], np.r_[cuts, len(frames)]) if b > a]
+        table, filtered = follow(batches, 200, settings)
+        expected = table.subset(filter_mask(table, 200, settings))
+        assert filtered.frame.tolist() == expected.frame.tolist()
+        assert filtered.label.tolist() == expected.label.tolist()
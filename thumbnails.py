@@ -0,0 +1,190 @@
+# Thumbnail strip of a video: small JPEG previews decoded at a fixed interval on a thread pool and
+# cached in one atlas file next to the video. Generation is incremental (an interrupted run resumes
+# with the missing thumbnails) and cancellable.
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from sidecar import load_sidecar, save_sidecar
+
+THUMBNAIL_VERSION = 1
+thumbnail_width = 160
+thumbnail_interval_s = 2.0  # seconds of video between thumbnails
+jpeg_quality = 80
+
+
+class ThumbnailAtlas:
+    def __init__(self, frames=(), blobs=()):
+        self.blobs = dict(zip((int(frame) for frame in frames), blobs))  # {frame: JPEG bytes}
+        self.frames = np.array(sorted(self.blobs), dtype=np.int64)
+        self.lock = threading.Lock()  # filled by the generator thread while the GUI reads it
+
+    def __len__(self):
+        return len(self.blobs)
+
+    def __contains__(self, frame):
+        return int(frame) in self.blobs
+
+    def add(self, frames, blobs):
+        with self.lock:
+            self.blobs.update(zip((int(frame) for frame in frames), blobs))
+            self.frames = np.array(sorted(self.blobs), dtype=np.int64)
+
+    # (frame, JPEG) of the thumbnail closest to frame, (None, None) while there is none
+    def nearest(self, frame):
+        with self.lock:
+            frames = self.frames
+            if not len(frames):
+                return None, None
+            position = int(np.searchsorted(frames, frame))
+            if position == len(frames) or (position > 0 and frame - frames[position - 1] < frames[position] - frame):
+                position -= 1
+            return int(frames[position]), self.blobs[int(frames[position])]
+
+    # All blobs concatenated into one array with their offsets, for the npz file
+    def packed(self):
+        with self.lock:
+            frames = self.frames
+            blobs = [self.blobs[int(frame)] for frame in frames]
+        offsets = np.cumsum([0] + [len(blob) for blob in blobs], dtype=np.int64)
+        data = np.frombuffer(b''.join(blobs), dtype=np.uint8)
+        return frames, offsets, data
+
+
+# Frames that get a thumbnail. When the keyframes are known each sample moves back to the keyframe
+# before it, so every thumbnail can be decoded without decoding the frames that depend on it.
+def sample_frames(video_index, interval_s=thumbnail_interval_s):
+    interval = max(int(round(video_index.fps * interval_s)), 1)
+    frames = np.arange(0, video_index.frame_count, interval, dtype=np.int64)
+    keyframes = video_index.keyframes
+    if video_index.keyframes_known:
+        frames = np.unique(keyframes[np.searchsorted(keyframes, frames, side='right') - 1])
+    return frames
+
+
+def atlas_path(video_path):
+    return video_path + '.thumbs.npz'
+
+
+# Returns the cached (possibly partial) atlas of the video, or an empty one
+def load_atlas(video_path, interval_s=thumbnail_interval_s):
+    def read(cached):
+        offsets, data = cached['offsets'], cached['data'].tobytes()
+        return ThumbnailAtlas(cached['frames'], [data[a:b] for a, b in zip(offsets[:-1], offsets[1:])])
+    atlas = load_sidecar(atlas_path(video_path), video_path, read,
+                         version=THUMBNAIL_VERSION, width=thumbnail_width, interval_s=interval_s)
+    return atlas if atlas is not None else ThumbnailAtlas()
+
+
+def save_atlas(video_path, atlas, interval_s=thumbnail_interval_s):
+    frames, offsets, data = atlas.packed()
+    save_sidecar(atlas_path(video_path), video_path, dict(frames=frames, offsets=offsets, data=data),
+                 version=THUMBNAIL_VERSION, width=thumbnail_width, interval_s=interval_s)
+
+
+def encode_thumbnail(image):
+    import cv2
+    height = max(int(round(image.shape[0] * thumbnail_width / image.shape[1])), 1)
+    if image.shape[1] != thumbnail_width:
+        image = cv2.resize(image, (thumbnail_width, height), interpolation=cv2.INTER_AREA)
+    ok, jpeg = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+    return jpeg.tobytes() if ok else None
+
+
+# Yields (frame, BGR image) for the sorted frames. PyAV seeks to the keyframe before every frame and,
+# when all frames are keyframes, skips decoding the others altogether.
+def decode_with_av(video_path, frames, video_index, cancelled):
+    import av
+    keyframes_only = video_index.keyframes_known and np.isin(frames, video_index.keyframes).all()
+    with av.open(video_path) as container:
+        stream = container.streams.video[0]
+        if keyframes_only:
+            stream.codec_context.skip_frame = 'NONKEY'
+        start = stream.start_time or 0
+        ticks_per_ms = 1 / (float(stream.time_base) * 1000)
+        half_frame = 500 / video_index.fps * ticks_per_ms
+        for frame in frames:
+            if cancelled():
+                return
+            target = start + int(round(video_index.frame_to_ms(frame) * ticks_per_ms))
+            container.seek(target, stream=stream, backward=True)
+            for decoded in container.decode(stream):
+                if keyframes_only or decoded.pts is None or decoded.pts >= target - half_frame:
+                    # swscale downscales while converting, the full-size frame is never copied out
+                    height = max(int(round(decoded.height * thumbnail_width / decoded.width)), 1)
+                    yield frame, decoded.to_ndarray(width=thumbnail_width, height=height, format='bgr24')
+                    break
+
+
+def decode_with_cv2(video_path, frames, video_index, cancelled):
+    import cv2
+    capture = cv2.VideoCapture(video_path)
+    try:
+        next_frame = 0
+        for frame in frames:
+            if cancelled():
+                return
+            if frame != next_frame:
+                capture.set(cv2.CAP_PROP_POS_FRAMES, int(frame))
+            ret, image = capture.read()
+            next_frame = frame + 1
+            if ret:
+                yield frame, image
+    finally:
+        capture.release()
+
+
+# Decodes the thumbnails missing from the atlas with max_workers threads, each working forward through
+# its own part of the video. cancelled() is polled between frames; progress(done, total) is called as
+# thumbnails arrive and the atlas is saved every save_every thumbnails so a cancelled run is not lost.
+def build_thumbnails(video_path, video_index, atlas, interval_s=thumbnail_interval_s, max_workers=None,
+                     cancelled=lambda: False, progress=None, save_every=64):
+    frames = sample_frames(video_index, interval_s)
+    missing = np.array([frame for frame in frames if frame not in atlas], dtype=np.int64)
+    if not len(missing):
+        return
+    try:
+        import av  # decoding with PyAV can skip the frames between keyframes
+        decode = decode_with_av
+    except ImportError:
+        decode = decode_with_cv2
+
+    max_workers = max_workers or max((os.cpu_count() or 2) // 2, 1)  # leave cores for playback
+    chunks = [chunk for chunk in np.array_split(missing, max_workers) if len(chunk)]
+    results = queue.Queue(maxsize=4 * len(chunks))  # bounded: the workers wait while the atlas catches up
+    finished = object()
+
+    def work(chunk):
+        try:
+            for frame, image in decode(video_path, chunk, video_index, cancelled):
+                results.put((frame, encode_thumbnail(image)))
+        finally:
+            results.put(finished)
+
+    done = len(frames) - len(missing)
+    unsaved = 0
+    with ThreadPoolExecutor(max_workers=len(chunks)) as pool:
+        futures = [pool.submit(work, chunk) for chunk in chunks]
+        running = len(chunks)
+        while running:
+            item = results.get()
+            if item is finished:
+                running -= 1
+                continue
+            frame, blob = item
+            done += 1
+            if blob is not None:
+                atlas.add([frame], [blob])  # visible to the GUI right away
+                unsaved += 1
+            if unsaved >= save_every:
+                save_atlas(video_path, atlas, interval_s)
+                unsaved = 0
+            if progress is not None:
+                progress(done, len(frames))
+
+    save_atlas(video_path, atlas, interval_s)
+    for future in futures:
+        future.result()  # raises the first decoding error
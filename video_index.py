@@ -0,0 +1,138 @@
+# Per-video frame/timestamp index built from one demux-only scan and cached next to the video.
+# Gives the exact frame count, frame <-> time mapping and the keyframe before any frame.
+import numpy as np
+
+from sidecar import load_sidecar, save_sidecar
+
+INDEX_VERSION = 1
+
+
+class VideoIndex:
+    def __init__(self, pts_ms, keyframes, fps):
+        self.pts_ms = np.asarray(pts_ms, dtype=np.float64)        # presentation time of every frame, sorted
+        self.keyframes = np.asarray(keyframes, dtype=np.int64)    # frame numbers of the keyframes, sorted
+        self.fps = float(fps)
+
+    # Index for a video with a constant frame rate, used when the file can not be scanned
+    @classmethod
+    def constant_rate(cls, fps, duration_ms):
+        frame_count = int(round(duration_ms * fps / 1000))
+        return cls(np.arange(frame_count) * (1000 / fps), [0], fps)
+
+    @property
+    def frame_count(self):
+        return len(self.pts_ms)
+
+    @property
+    def duration_ms(self):
+        return self.pts_ms[-1] + 1000 / self.fps if self.frame_count else 0.0
+
+    # Frames outside the video are extrapolated with the frame rate
+    def frame_to_ms(self, frame):
+        frame = max(int(frame), 0)
+        if frame >= self.frame_count:
+            last_ms = self.pts_ms[-1] if self.frame_count else -1000 / self.fps
+            return float(last_ms + (frame - self.frame_count + 1) * 1000 / self.fps)
+        return float(self.pts_ms[frame])
+
+    # Frame that is on screen at time ms
+    def ms_to_frame(self, ms):
+        if not self.frame_count:
+            return max(int(ms * self.fps / 1000), 0)
+        frame = int(np.searchsorted(self.pts_ms, ms + 0.5, side='right')) - 1
+        return min(max(frame, 0), self.frame_count - 1)
+
+    # Scans without PyAV and constant-rate indexes only list frame 0
+    @property
+    def keyframes_known(self):
+        return len(self.keyframes) > 1
+
+    # Keyframe a decoder has to start from to show frame
+    def keyframe_before(self, frame):
+        position = int(np.searchsorted(self.keyframes, frame, side='right')) - 1
+        return int(self.keyframes[max(position, 0)]) if len(self.keyframes) else 0
+
+
+# Reads the packet timestamps and keyframe flags of the first video stream without decoding.
+# Returns None when cancelled() turns True.
+def scan_with_av(video_path, cancelled=lambda: False):
+    import av
+    with av.open(video_path) as container:
+        stream = container.streams.video[0]
+        start = stream.start_time or 0
+        pts = []
+        is_keyframe = []
+        for packet in container.demux(stream):
+            if len(pts) % 1000 == 0 and cancelled():
+                return None
+            if packet.pts is not None:
+                pts.append(packet.pts)
+                is_keyframe.append(packet.is_keyframe)
+        fps = float(stream.average_rate or stream.guessed_rate or 0)
+        time_base = float(stream.time_base)
+
+    # Packets come in decode order, frames are numbered in presentation order
+    pts = np.asarray(pts, dtype=np.int64)
+    order = np.argsort(pts, kind='stable')
+    pts_ms = (pts[order] - start) * time_base * 1000
+    keyframes = np.nonzero(np.asarray(is_keyframe, dtype=bool)[order])[0]
+    if not fps and len(pts_ms) > 1:
+        fps = 1000 * (len(pts_ms) - 1) / (pts_ms[-1] - pts_ms[0])
+    return VideoIndex(pts_ms, keyframes, fps)
+
+
+# Without PyAV every frame has to be decoded once to learn its timestamp, keyframes are unknown
+def scan_with_cv2(video_path, cancelled=lambda: False):
+    import cv2
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        return None
+    fps = capture.get(cv2.CAP_PROP_FPS)
+    pts_ms = []
+    while capture.grab():
+        pts_ms.append(capture.get(cv2.CAP_PROP_POS_MSEC))
+        if len(pts_ms) % 100 == 0 and cancelled():
+            capture.release()
+            return None
+    capture.release()
+    if not pts_ms or not fps:
+        return None
+    return VideoIndex(np.asarray(pts_ms) - pts_ms[0], [0], fps)
+
+
+def index_path(video_path):
+    return video_path + '.index.npz'
+
+
+# Returns the cached index of the video, or None when it has not been scanned yet
+def cached_video_index(video_path):
+    return load_sidecar(index_path(video_path), video_path,
+                        lambda cached: VideoIndex(cached['pts_ms'], cached['keyframes'], float(cached['fps'])),
+                        version=INDEX_VERSION)
+
+
+# Returns the cached index of the video, scanning it the first time. Returns None when it can not be read
+# or cancelled() turned True. Without PyAV the scan decodes the whole video, so call it off the GUI thread.
+def load_video_index(video_path, cancelled=lambda: False):
+    index = cached_video_index(video_path)
+    if index is not None:
+        return index
+
+    # PyAV is only imported when a video has to be scanned, it is optional
+    try:
+        import av
+        scan, scan_errors = scan_with_av, (OSError, IndexError, ValueError, av.FFmpegError)
+    except ImportError:
+        scan, scan_errors = scan_with_cv2, (OSError, IndexError, ValueError)
+
+    try:
+        index = scan(video_path, cancelled)
+    except scan_errors as e:  # unreadable file or no video stream
+        print(f"Could not index {video_path}: {e}")
+        return None
+    if index is None or not index.frame_count:
+        return None
+
+    save_sidecar(index_path(video_path), video_path,
+                 dict(pts_ms=index.pts_ms, keyframes=index.keyframes, fps=index.fps), version=INDEX_VERSION)
+    return index